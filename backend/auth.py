@@ -3,15 +3,31 @@ from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import HTTPException, status
+from cachetools import TTLCache
+import hashlib
 import secrets
+import time
 import uuid
 import os
+from functools import lru_cache
+
+try:
+    import re2 as regex_engine  # Linear-time matching when google-re2 is installed
+except ImportError:
+    import re as regex_engine
 
 # Security configurations
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 RESET_TOKEN_EXPIRE_MINUTES = 60
+TOKEN_CACHE_TTL_SECONDS = 5
+
+# Site domain format, compiled once at import
+MAX_DOMAIN_LENGTH = 253
+DOMAIN_PATTERN = regex_engine.compile(
+    r'^[a-zA-Z0-9]([a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?(\.[a-zA-Z0-9]([a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?)*$'
+)
 
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -40,13 +56,23 @@ def create_reset_token() -> str:
     """Create password reset token."""
     return secrets.token_urlsafe(32)
 
+# Recently verified tokens by digest, with their expiry so a cached entry
+# never outlives the token itself
+token_cache: TTLCache = TTLCache(maxsize=10_000, ttl=TOKEN_CACHE_TTL_SECONDS)
+
 def verify_token(token: str) -> Optional[str]:
     """Verify JWT token and return email."""
+    key = hashlib.sha256(token.encode()).digest()
+    cached = token_cache.get(key)
+    if cached is not None and cached[1] > time.time():
+        return cached[0]
+    
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
         if email is None:
             return None
+        token_cache[key] = (email, payload.get("exp", 0))
         return email
     except JWTError:
         return None
@@ -55,6 +81,7 @@ def generate_site_id() -> str:
     """Generate unique site ID."""
     return str(uuid.uuid4())
 
+@lru_cache(maxsize=4096)
 def generate_embed_script(site_id: str, backend_url: str) -> str:
     """Generate embed script for widget."""
     script = f"""<!-- AI Voice Assistant Widget -->
@@ -87,6 +114,7 @@ def generate_embed_script(site_id: str, backend_url: str) -> str:
 </script>"""
     return script.strip()
 
+@lru_cache(maxsize=4096)
 def get_installation_instructions(site_id: str) -> str:
     """Generate installation instructions."""
     return f"""
@@ -192,6 +220,5 @@ def generate_reset_email_content(reset_token: str, user_name: str) -> tuple:
 
 def validate_site_domain(domain: str) -> bool:
     """Validate site domain format."""
-    import re
-    pattern = r'^[a-zA-Z0-9]([a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?(\.[a-zA-Z0-9]([a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?)*$'
-    return re.match(pattern, domain) is not None
\ No newline at end of file
+    # Oversized input is rejected before it reaches the regex
+    return len(domain) <= MAX_DOMAIN_LENGTH and DOMAIN_PATTERN.match(domain) is not None
\ No newline at end of file
@@ -1,153 +1,301 @@
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, AsyncIterator
 from datetime import datetime, timedelta
-from pymongo import MongoClient, DESCENDING
-from pymongo.collection import Collection
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection
+from pymongo import DESCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
 from bson import ObjectId
+from cachetools import TTLCache
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import hashlib
 import os
 import numpy as np
+import orjson
 from models import UserDB, SiteDB, InteractionDB, AnalyticsStats, DashboardStats
 from auth import get_password_hash, verify_password, create_reset_token
 import logging
 
+try:
+    import redis.asyncio as aioredis
+except ImportError:
+    aioredis = None
+
 logger = logging.getLogger(__name__)
 
+USER_CACHE_TTL_SECONDS = 60
+SITE_CONFIG_CACHE_TTL_SECONDS = 60
+SITE_CACHE_TTL_SECONDS = 30
+SITE_INTELLIGENCE_CACHE_TTL_SECONDS = 60
+SHARED_SITE_CONFIG_TTL_SECONDS = 300
+SITE_CONFIG_INVALIDATION_CHANNEL = "site-config-invalidate"
+
+# Writes a loaded config back to Redis only if no invalidation bumped the site's
+# version since the load began, so a load that read Mongo before an update can't
+# republish the old config
+STORE_SITE_CONFIG_SCRIPT = """
+if (redis.call('GET', KEYS[2]) or '0') == ARGV[1] then
+    redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+    return 1
+end
+return 0
+"""
+
+# bcrypt gets its own threads so a burst of logins can't starve the default
+# executor used by other blocking work
+PASSWORD_EXECUTOR = ThreadPoolExecutor(max_workers=os.cpu_count() or 4, thread_name_prefix="password")
+
+def hash_reset_token(token: str) -> str:
+    """Digest stored and queried in place of the raw reset token."""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+async def run_password_task(func, *args):
+    """Run a password hash or check on the dedicated executor."""
+    return await asyncio.get_running_loop().run_in_executor(PASSWORD_EXECUTOR, func, *args)
+
+class BatchWriter:
+    """Buffers documents for a collection and writes them with insert_many."""
+    
+    def __init__(self, collection: AsyncIOMotorCollection, max_batch: int = 200, max_delay: float = 0.1, max_queue: int = 10_000, bypass_validation: bool = False):
+        self.collection = collection
+        # Only for writers whose documents all come from a Pydantic model
+        self.bypass_validation = bypass_validation
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+    
+    def put(self, document: Dict[str, Any]) -> bool:
+        """Queue a document for the next batch, dropping it if the queue is full."""
+        try:
+            self.queue.put_nowait(document)
+            return True
+        except asyncio.QueueFull:
+            logger.warning("Write queue for %s is full, dropping document", self.collection.name)
+            return False
+    
+    async def run(self):
+        """Flush every max_delay seconds or max_batch documents, whichever comes first."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self.write(batch)
+    
+    async def drain(self):
+        """Write everything still queued, used on shutdown."""
+        batch = []
+        while not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        if batch:
+            await self.write(batch)
+    
+    async def write(self, batch: List[Dict[str, Any]]):
+        try:
+            await self.collection.insert_many(batch, ordered=False, bypass_document_validation=self.bypass_validation)
+        except Exception as e:
+            logger.error("Error writing %s documents to %s: %s", len(batch), self.collection.name, e)
+
 class DatabaseService:
-    def __init__(self, mongo_client: MongoClient):
+    def __init__(self, mongo_client: AsyncIOMotorClient, redis_url: Optional[str] = None):
         self.db = mongo_client.ai_voice_assistant
-        self.users: Collection = self.db.users
-        self.sites: Collection = self.db.sites
-        self.interactions: Collection = self.db.interactions
-        self.conversations: Collection = self.db.conversations
+        self.users: AsyncIOMotorCollection = self.db.users
+        self.sites: AsyncIOMotorCollection = self.db.sites
+        self.interactions: AsyncIOMotorCollection = self.db.interactions
+        self.conversations: AsyncIOMotorCollection = self.db.conversations
         
         # New collections for Website Intelligence
-        self.site_intelligence: Collection = self.db.site_intelligence
-        self.user_journeys: Collection = self.db.user_journeys
-        self.intent_analysis: Collection = self.db.intent_analysis
-        self.navigation_suggestions: Collection = self.db.navigation_suggestions
-        self.roi_reports: Collection = self.db.roi_reports
+        self.site_intelligence: AsyncIOMotorCollection = self.db.site_intelligence
+        self.user_journeys: AsyncIOMotorCollection = self.db.user_journeys
+        self.intent_analysis: AsyncIOMotorCollection = self.db.intent_analysis
+        self.navigation_suggestions: AsyncIOMotorCollection = self.db.navigation_suggestions
+        self.roi_reports: AsyncIOMotorCollection = self.db.roi_reports
+        
+        # Recently authenticated users
+        self.user_cache: TTLCache = TTLCache(maxsize=10_000, ttl=USER_CACHE_TTL_SECONDS)
+        
+        # Widget configs are read on every chat turn but change rarely
+        self.site_config_cache: TTLCache = TTLCache(maxsize=10_000, ttl=SITE_CONFIG_CACHE_TTL_SECONDS)
+        self.site_config_loads: Dict[str, asyncio.Future] = {}
+        
+        # Optional Redis tier shared by all workers; changes are broadcast so every
+        # worker drops its local copy
+        self.redis = aioredis.from_url(redis_url) if aioredis is not None and redis_url else None
+        self.store_site_config_script = (
+            self.redis.register_script(STORE_SITE_CONFIG_SCRIPT) if self.redis is not None else None
+        )
+        
+        # Sites by id, for dashboard reads; with Redis, writes on any worker evict them
+        # through the site config invalidation channel
+        self.site_cache: TTLCache = TTLCache(maxsize=10_000, ttl=SITE_CACHE_TTL_SECONDS)
+        
+        # Set once the unique active-domain index exists; until then site writes
+        # check for duplicate domains themselves
+        self.domain_index_ready = False
         
-        # Create indexes for performance
-        self._create_indexes()
+        # Crawl results, read on every chat turn; sites that were never crawled are
+        # cached as None so they skip the query too
+        self.site_intelligence_cache: TTLCache = TTLCache(maxsize=10_000, ttl=SITE_INTELLIGENCE_CACHE_TTL_SECONDS)
     
-    def _create_indexes(self):
+    async def create_indexes(self):
         """Create database indexes for performance."""
         try:
             # Users indexes
-            self.users.create_index("email", unique=True)
-            self.users.create_index("reset_token")
+            await self.users.create_index("email", unique=True)
+            await self.users.create_index("reset_token")
             
             # Sites indexes
-            self.sites.create_index("user_id")
-            self.sites.create_index("domain")
-            self.sites.create_index([("user_id", 1), ("is_active", 1)])
+            await self.sites.create_index("user_id")
+            await self.sites.create_index("domain")
+            await self.sites.create_index([("user_id", 1), ("is_active", 1)])
             
             # Interactions indexes
-            self.interactions.create_index("site_id")
-            self.interactions.create_index("session_id")
-            self.interactions.create_index("timestamp")
-            self.interactions.create_index([("site_id", 1), ("timestamp", -1)])
+            await self.interactions.create_index("site_id")
+            await self.interactions.create_index("session_id")
+            await self.interactions.create_index("timestamp")
+            await self.interactions.create_index([("site_id", 1), ("timestamp", -1)])
             
-            # Conversations indexes
-            self.conversations.create_index("site_id")
-            self.conversations.create_index("session_id")
-            self.conversations.create_index("timestamp")
+            # Conversations indexes; session_id and timestamp lookups use the compound indexes they prefix
+            await self.conversations.create_index("site_id")
+            await self.conversations.create_index("expires_at", expireAfterSeconds=0)
+            await self.conversations.create_index([("session_id", 1), ("site_id", 1), ("timestamp", -1)])
+            await self.conversations.create_index([("visitor_id", 1), ("site_id", 1), ("timestamp", -1)])
+            await self.conversations.create_index([("timestamp", -1), ("model", 1)])
             
             # Website Intelligence indexes
-            self.site_intelligence.create_index("site_id", unique=True)
-            self.site_intelligence.create_index("domain")
-            self.site_intelligence.create_index("last_crawl")
+            await self.site_intelligence.create_index("site_id", unique=True)
+            await self.site_intelligence.create_index("domain")
+            await self.site_intelligence.create_index("last_crawl")
             
             # User Journeys indexes
-            self.user_journeys.create_index("visitor_id")
-            self.user_journeys.create_index("session_id")
-            self.user_journeys.create_index("site_id")
-            self.user_journeys.create_index([("site_id", 1), ("timestamp", -1)])
+            await self.user_journeys.create_index("visitor_id")
+            await self.user_journeys.create_index("session_id")
+            await self.user_journeys.create_index("site_id")
+            await self.user_journeys.create_index([("site_id", 1), ("timestamp", -1)])
             
             # Intent Analysis indexes
-            self.intent_analysis.create_index("site_id")
-            self.intent_analysis.create_index("intent_type")
-            self.intent_analysis.create_index("timestamp")
+            await self.intent_analysis.create_index("site_id")
+            await self.intent_analysis.create_index("intent_type")
+            await self.intent_analysis.create_index("timestamp")
             
             # Navigation Suggestions indexes
-            self.navigation_suggestions.create_index("site_id")
-            self.navigation_suggestions.create_index("current_page")
+            await self.navigation_suggestions.create_index("site_id")
+            await self.navigation_suggestions.create_index("current_page")
             
             # ROI Reports indexes
-            self.roi_reports.create_index("site_id")
-            self.roi_reports.create_index([("site_id", 1), ("period_start", -1)])
+            await self.roi_reports.create_index("site_id")
+            await self.roi_reports.create_index([("site_id", 1), ("period_start", -1)])
             
             logger.info("Database indexes created successfully")
         except Exception as e:
-            logger.error(f"Error creating indexes: {e}")
+            logger.error("Error creating indexes: %s", e)
+        
+        # Separate so existing duplicate domains can't block the other indexes;
+        # soft-deleted sites are excluded so their domains can be reused
+        try:
+            await self.sites.create_index(
+                "domain",
+                unique=True,
+                partialFilterExpression={"is_active": True},
+                name="domain_active_unique"
+            )
+            self.domain_index_ready = True
+        except Exception as e:
+            logger.error(
+                "Error creating unique domain index, checking domains in the app until it exists: %s", e
+            )
     
     # User Operations
     async def create_user(self, email: str, full_name: str, password: str) -> Optional[UserDB]:
         """Create a new user."""
         try:
             # Check if user already exists
-            if self.users.find_one({"email": email}):
+            if await self.users.find_one({"email": email}):
                 return None
             
             user_data = UserDB(
                 email=email,
                 full_name=full_name,
-                hashed_password=get_password_hash(password)
+                hashed_password=await run_password_task(get_password_hash, password)
             )
             
-            result = self.users.insert_one(user_data.dict())
+            result = await self.users.insert_one(user_data.dict())
             if result.inserted_id:
                 return user_data
             return None
         except Exception as e:
-            logger.error(f"Error creating user: {e}")
+            logger.error("Error creating user: %s", e)
             return None
     
-    async def get_user_by_email(self, email: str) -> Optional[UserDB]:
+    async def get_user_by_email(self, email: str, use_cache: bool = True) -> Optional[UserDB]:
         """Get user by email."""
         try:
-            user_data = self.users.find_one({"email": email})
+            if use_cache:
+                cached_user = self.user_cache.get(email)
+                if cached_user:
+                    return cached_user
+            
+            user_data = await self.users.find_one({"email": email})
             if user_data:
                 user_data.pop('_id', None)  # Remove MongoDB ObjectId
-                return UserDB(**user_data)
+                user = UserDB(**user_data)
+                self.user_cache[email] = user
+                return user
             return None
         except Exception as e:
-            logger.error(f"Error getting user by email: {e}")
+            logger.error("Error getting user by email: %s", e)
             return None
     
+    def invalidate_user(self, user_id: Optional[str] = None, email: Optional[str] = None):
+        """Drop a user from the lookup cache after their record changes."""
+        if email:
+            self.user_cache.pop(email, None)
+        if user_id:
+            for cached_email, user in list(self.user_cache.items()):
+                if user.id == user_id:
+                    self.user_cache.pop(cached_email, None)
+    
     async def get_user_by_id(self, user_id: str) -> Optional[UserDB]:
         """Get user by ID."""
         try:
-            user_data = self.users.find_one({"id": user_id})
+            user_data = await self.users.find_one({"id": user_id})
             if user_data:
                 user_data.pop('_id', None)
                 return UserDB(**user_data)
             return None
         except Exception as e:
-            logger.error(f"Error getting user by ID: {e}")
+            logger.error("Error getting user by ID: %s", e)
             return None
     
     async def authenticate_user(self, email: str, password: str) -> Optional[UserDB]:
         """Authenticate user credentials."""
         try:
-            user = await self.get_user_by_email(email)
-            if user and verify_password(password, user.hashed_password):
+            user = await self.get_user_by_email(email, use_cache=False)
+            if user and await run_password_task(verify_password, password, user.hashed_password):
                 return user
             return None
         except Exception as e:
-            logger.error(f"Error authenticating user: {e}")
+            logger.error("Error authenticating user: %s", e)
             return None
     
     async def update_user(self, user_id: str, update_data: Dict[str, Any]) -> bool:
         """Update user information."""
         try:
             update_data["updated_at"] = datetime.utcnow()
-            result = self.users.update_one(
+            result = await self.users.update_one(
                 {"id": user_id},
                 {"$set": update_data}
             )
+            self.invalidate_user(user_id=user_id)
             return result.modified_count > 0
         except Exception as e:
-            logger.error(f"Error updating user: {e}")
+            logger.error("Error updating user: %s", e)
             return False
     
     async def set_reset_token(self, email: str) -> Optional[str]:
@@ -156,10 +304,11 @@ class DatabaseService:
             reset_token = create_reset_token()
             reset_expires = datetime.utcnow() + timedelta(minutes=60)
             
-            result = self.users.update_one(
+            # Only the digest is stored, so a leaked users collection can't be used to reset passwords
+            result = await self.users.update_one(
                 {"email": email},
                 {"$set": {
-                    "reset_token": reset_token,
+                    "reset_token": hash_reset_token(reset_token),
                     "reset_token_expires": reset_expires,
                     "updated_at": datetime.utcnow()
                 }}
@@ -169,33 +318,48 @@ class DatabaseService:
                 return reset_token
             return None
         except Exception as e:
-            logger.error(f"Error setting reset token: {e}")
+            logger.error("Error setting reset token: %s", e)
             return None
     
     async def reset_password(self, token: str, new_password: str) -> bool:
         """Reset user password with token."""
         try:
-            user_data = self.users.find_one({
-                "reset_token": token,
-                "reset_token_expires": {"$gt": datetime.utcnow()}
-            })
-            
+            # Check the token before hashing, so made-up tokens cost only this lookup
+            token_digest = hash_reset_token(token)
+            user_data = await self.users.find_one(
+                {
+                    "reset_token": token_digest,
+                    "reset_token_expires": {"$gt": datetime.utcnow()}
+                },
+                {"id": 1, "email": 1}
+            )
             if not user_data:
                 return False
             
-            result = self.users.update_one(
-                {"id": user_data["id"]},
+            hashed_password = await run_password_task(get_password_hash, new_password)
+            
+            # Consuming the token is conditional on it still being set, so it can only be
+            # used once even under concurrent requests
+            result = await self.users.update_one(
+                {
+                    "id": user_data["id"],
+                    "reset_token": token_digest,
+                    "reset_token_expires": {"$gt": datetime.utcnow()}
+                },
                 {"$set": {
-                    "hashed_password": get_password_hash(new_password),
+                    "hashed_password": hashed_password,
                     "reset_token": None,
                     "reset_token_expires": None,
                     "updated_at": datetime.utcnow()
                 }}
             )
+            if result.modified_count == 0:
+                return False
             
-            return result.modified_count > 0
+            self.invalidate_user(email=user_data["email"])
+            return True
         except Exception as e:
-            logger.error(f"Error resetting password: {e}")
+            logger.error("Error resetting password: %s", e)
             return False
     
     # Site Operations
@@ -206,75 +370,92 @@ class DatabaseService:
                 user_id=user_id,
                 **site_data
             )
+            await self.ensure_domain_available(site.domain)
             
-            result = self.sites.insert_one(site.dict())
+            result = await self.sites.insert_one(site.dict())
             if result.inserted_id:
+                # A miss for this id may already be cached
+                self.forget_site_config(site.id)
+                await self.invalidate_shared_site_config(site.id)
                 return site
             return None
+        except DuplicateKeyError:
+            raise
         except Exception as e:
-            logger.error(f"Error creating site: {e}")
+            logger.error("Error creating site: %s", e)
             return None
     
-    async def get_user_sites(self, user_id: str) -> List[SiteDB]:
-        """Get all sites for a user."""
-        try:
-            sites_data = list(self.sites.find({"user_id": user_id}).sort("created_at", DESCENDING))
-            sites = []
-            for site_data in sites_data:
-                site_data.pop('_id', None)
-                sites.append(SiteDB(**site_data))
-            return sites
-        except Exception as e:
-            logger.error(f"Error getting user sites: {e}")
-            return []
+    async def iter_user_sites(self, user_id: str) -> AsyncIterator[SiteDB]:
+        """Yield a user's sites as the cursor produces them; query errors propagate to the caller."""
+        async for site_data in self.sites.find({"user_id": user_id}, {"_id": 0}).sort("created_at", DESCENDING):
+            yield SiteDB(**site_data)
     
     async def get_site_by_id(self, site_id: str, user_id: str) -> Optional[SiteDB]:
         """Get site by ID and user ID."""
+        cached_site = self.site_cache.get(site_id)
+        if cached_site:
+            return cached_site if cached_site.user_id == user_id else None
+        
         try:
-            site_data = self.sites.find_one({"id": site_id, "user_id": user_id})
+            site_data = await self.sites.find_one({"id": site_id, "user_id": user_id})
             if site_data:
                 site_data.pop('_id', None)
-                return SiteDB(**site_data)
+                site = SiteDB(**site_data)
+                self.site_cache[site_id] = site
+                return site
             return None
         except Exception as e:
-            logger.error(f"Error getting site by ID: {e}")
+            logger.error("Error getting site by ID: %s", e)
             return None
     
-    async def get_site_by_domain(self, domain: str) -> Optional[SiteDB]:
-        """Get site by domain."""
-        try:
-            site_data = self.sites.find_one({"domain": domain, "is_active": True})
-            if site_data:
-                site_data.pop('_id', None)
-                return SiteDB(**site_data)
-            return None
-        except Exception as e:
-            logger.error(f"Error getting site by domain: {e}")
-            return None
+    async def ensure_domain_available(self, domain: str, site_id: Optional[str] = None):
+        """Raise DuplicateKeyError if another active site uses the domain and the unique index is missing."""
+        if self.domain_index_ready:
+            return
+        query = {"domain": domain, "is_active": True}
+        if site_id:
+            query["id"] = {"$ne": site_id}
+        if await self.sites.find_one(query, {"_id": 1}):
+            raise DuplicateKeyError(f"Domain already exists: {domain}")
+    
+    def invalidate_site(self, site_id: str):
+        """Drop a site from this worker's lookup caches after it changes."""
+        self.site_cache.pop(site_id, None)
+        self.forget_site_config(site_id)
     
-    async def update_site(self, site_id: str, user_id: str, update_data: Dict[str, Any]) -> bool:
-        """Update site information."""
+    async def update_site(self, site_id: str, user_id: str, update_data: Dict[str, Any]) -> Optional[SiteDB]:
+        """Update site information and return the updated site."""
         try:
+            if "domain" in update_data:
+                await self.ensure_domain_available(update_data["domain"], site_id)
             update_data["updated_at"] = datetime.utcnow()
-            result = self.sites.update_one(
+            site_data = await self.sites.find_one_and_update(
                 {"id": site_id, "user_id": user_id},
-                {"$set": update_data}
+                {"$set": update_data},
+                projection={"_id": 0},
+                return_document=ReturnDocument.AFTER
             )
-            return result.modified_count > 0
+            self.invalidate_site(site_id)
+            await self.invalidate_shared_site_config(site_id)
+            return SiteDB(**site_data) if site_data else None
+        except DuplicateKeyError:
+            raise
         except Exception as e:
-            logger.error(f"Error updating site: {e}")
-            return False
+            logger.error("Error updating site: %s", e)
+            return None
     
     async def delete_site(self, site_id: str, user_id: str) -> bool:
         """Delete site (soft delete)."""
         try:
-            result = self.sites.update_one(
+            result = await self.sites.update_one(
                 {"id": site_id, "user_id": user_id},
                 {"$set": {"is_active": False, "updated_at": datetime.utcnow()}}
             )
+            self.invalidate_site(site_id)
+            await self.invalidate_shared_site_config(site_id)
             return result.modified_count > 0
         except Exception as e:
-            logger.error(f"Error deleting site: {e}")
+            logger.error("Error deleting site: %s", e)
             return False
     
     # Analytics Operations
@@ -282,10 +463,10 @@ class DatabaseService:
         """Create a new interaction record."""
         try:
             interaction = InteractionDB(**interaction_data)
-            result = self.interactions.insert_one(interaction.dict())
+            result = await self.interactions.insert_one(interaction.dict())
             return bool(result.inserted_id)
         except Exception as e:
-            logger.error(f"Error creating interaction: {e}")
+            logger.error("Error creating interaction: %s", e)
             return False
     
     async def get_site_analytics(self, site_id: str, days: int = 30) -> AnalyticsStats:
@@ -293,64 +474,57 @@ class DatabaseService:
         try:
             start_date = datetime.utcnow() - timedelta(days=days)
             
-            # Total interactions
-            total_interactions = self.interactions.count_documents({
-                "site_id": site_id,
-                "timestamp": {"$gte": start_date}
-            })
-            
-            # Total sessions
-            total_sessions = len(self.interactions.distinct("session_id", {
-                "site_id": site_id,
-                "timestamp": {"$gte": start_date}
-            }))
-            
-            # Total conversations
-            total_conversations = self.conversations.count_documents({
-                "site_id": site_id,
-                "timestamp": {"$gte": start_date}
-            })
-            
-            # Average session duration (simplified)
-            avg_session_duration = 0.0  # TODO: Implement proper session duration calculation
-            
-            # Top interaction types
+            # Every interaction statistic comes from one $facet pass over the window,
+            # run alongside the conversation count
             pipeline = [
                 {"$match": {"site_id": site_id, "timestamp": {"$gte": start_date}}},
-                {"$group": {"_id": "$interaction_type", "count": {"$sum": 1}}},
-                {"$sort": {"count": -1}},
-                {"$limit": 10}
+                {"$facet": {
+                    "total": [{"$count": "count"}],
+                    "sessions": [{"$group": {"_id": "$session_id"}}, {"$count": "count"}],
+                    "top_types": [
+                        {"$group": {"_id": "$interaction_type", "count": {"$sum": 1}}},
+                        {"$sort": {"count": -1}},
+                        {"$limit": 10}
+                    ],
+                    "daily": [
+                        {"$group": {
+                            "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp"}},
+                            "interactions": {"$sum": 1},
+                            "sessions": {"$addToSet": "$session_id"}
+                        }},
+                        {"$project": {
+                            "date": "$_id",
+                            "interactions": 1,
+                            "sessions": {"$size": "$sessions"}
+                        }},
+                        {"$sort": {"date": 1}}
+                    ],
+                    "popular": [
+                        {"$match": {"user_message": {"$ne": None}}},
+                        {"$group": {"_id": "$user_message", "count": {"$sum": 1}}},
+                        {"$sort": {"count": -1}},
+                        {"$limit": 10}
+                    ]
+                }}
             ]
-            top_types = list(self.interactions.aggregate(pipeline))
-            top_interaction_types = [{"type": item["_id"], "count": item["count"]} for item in top_types]
+            facets, total_conversations = await asyncio.gather(
+                self.interactions.aggregate(pipeline).to_list(None),
+                self.conversations.count_documents({
+                    "site_id": site_id,
+                    "timestamp": {"$gte": start_date}
+                })
+            )
+            facets = facets[0]
             
-            # Daily stats
-            daily_pipeline = [
-                {"$match": {"site_id": site_id, "timestamp": {"$gte": start_date}}},
-                {"$group": {
-                    "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp"}},
-                    "interactions": {"$sum": 1},
-                    "sessions": {"$addToSet": "$session_id"}
-                }},
-                {"$project": {
-                    "date": "$_id",
-                    "interactions": 1,
-                    "sessions": {"$size": "$sessions"}
-                }},
-                {"$sort": {"date": 1}}
-            ]
-            daily_data = list(self.interactions.aggregate(daily_pipeline))
-            daily_stats = [{"date": item["date"], "interactions": item["interactions"], "sessions": item["sessions"]} for item in daily_data]
+            total_interactions = facets["total"][0]["count"] if facets["total"] else 0
+            total_sessions = facets["sessions"][0]["count"] if facets["sessions"] else 0
             
-            # Popular questions
-            popular_pipeline = [
-                {"$match": {"site_id": site_id, "user_message": {"$exists": True, "$ne": None}, "timestamp": {"$gte": start_date}}},
-                {"$group": {"_id": "$user_message", "count": {"$sum": 1}}},
-                {"$sort": {"count": -1}},
-                {"$limit": 10}
-            ]
-            popular_data = list(self.interactions.aggregate(popular_pipeline))
-            popular_questions = [{"question": item["_id"], "count": item["count"]} for item in popular_data]
+            # Average session duration (simplified)
+            avg_session_duration = 0.0  # TODO: Implement proper session duration calculation
+            
+            top_interaction_types = [{"type": item["_id"], "count": item["count"]} for item in facets["top_types"]]
+            daily_stats = [{"date": item["date"], "interactions": item["interactions"], "sessions": item["sessions"]} for item in facets["daily"]]
+            popular_questions = [{"question": item["_id"], "count": item["count"]} for item in facets["popular"]]
             
             return AnalyticsStats(
                 total_interactions=total_interactions,
@@ -362,7 +536,7 @@ class DatabaseService:
                 popular_questions=popular_questions
             )
         except Exception as e:
-            logger.error(f"Error getting site analytics: {e}")
+            logger.error("Error getting site analytics: %s", e)
             return AnalyticsStats(
                 total_interactions=0,
                 total_sessions=0,
@@ -377,51 +551,51 @@ class DatabaseService:
         """Get dashboard statistics for a user."""
         try:
             # Get user's sites
-            user_site_ids = [site["id"] for site in self.sites.find({"user_id": user_id, "is_active": True}, {"id": 1})]
+            user_sites = [site async for site in self.sites.find({"user_id": user_id, "is_active": True}, {"_id": 0, "id": 1, "name": 1})]
+            user_site_ids = [site["id"] for site in user_sites]
             
             # Total sites
             total_sites = len(user_site_ids)
             
-            # Total interactions
-            total_interactions = self.interactions.count_documents({
-                "site_id": {"$in": user_site_ids}
-            })
+            # Per-site counts, active sessions (last 24 hours) and recent interactions
+            # in one $facet pass, run alongside the conversation count
+            yesterday = datetime.utcnow() - timedelta(days=1)
+            pipeline = [
+                {"$match": {"site_id": {"$in": user_site_ids}}},
+                {"$facet": {
+                    "per_site": [{"$group": {"_id": "$site_id", "count": {"$sum": 1}}}],
+                    "active_sessions": [
+                        {"$match": {"timestamp": {"$gte": yesterday}}},
+                        {"$group": {"_id": "$session_id"}},
+                        {"$count": "count"}
+                    ],
+                    "recent": [
+                        {"$sort": {"timestamp": DESCENDING}},
+                        {"$limit": 10},
+                        {"$project": {"_id": 0}}
+                    ]
+                }}
+            ]
+            facets, total_conversations = await asyncio.gather(
+                self.interactions.aggregate(pipeline).to_list(None),
+                self.conversations.count_documents({"site_id": {"$in": user_site_ids}})
+            )
+            facets = facets[0]
             
-            # Total conversations
-            total_conversations = self.conversations.count_documents({
-                "site_id": {"$in": user_site_ids}
-            })
+            interactions_by_site = {item["_id"]: item["count"] for item in facets["per_site"]}
+            total_interactions = sum(interactions_by_site.values())
+            active_sessions = facets["active_sessions"][0]["count"] if facets["active_sessions"] else 0
+            recent_interactions = [InteractionDB(**interaction) for interaction in facets["recent"]]
             
-            # Active sessions (last 24 hours)
-            yesterday = datetime.utcnow() - timedelta(days=1)
-            active_sessions = len(self.interactions.distinct("session_id", {
-                "site_id": {"$in": user_site_ids},
-                "timestamp": {"$gte": yesterday}
-            }))
-            
-            # Recent interactions
-            recent_data = list(self.interactions.find({
-                "site_id": {"$in": user_site_ids}
-            }).sort("timestamp", DESCENDING).limit(10))
-            
-            recent_interactions = []
-            for interaction in recent_data:
-                interaction.pop('_id', None)
-                recent_interactions.append(InteractionDB(**interaction))
-            
-            # Site performance
-            site_performance = []
-            for site_id in user_site_ids:
-                site_interactions = self.interactions.count_documents({"site_id": site_id})
-                site_data = self.sites.find_one({"id": site_id}, {"name": 1})
-                if site_data:
-                    site_performance.append({
-                        "site_id": site_id,
-                        "site_name": site_data["name"],
-                        "interactions": site_interactions
-                    })
-            
-            # Sort by interactions
+            # Site performance, sorted by interactions
+            site_performance = [
+                {
+                    "site_id": site["id"],
+                    "site_name": site["name"],
+                    "interactions": interactions_by_site.get(site["id"], 0)
+                }
+                for site in user_sites
+            ]
             site_performance.sort(key=lambda x: x["interactions"], reverse=True)
             
             return DashboardStats(
@@ -433,7 +607,7 @@ class DatabaseService:
                 site_performance=site_performance
             )
         except Exception as e:
-            logger.error(f"Error getting dashboard stats: {e}")
+            logger.error("Error getting dashboard stats: %s", e)
             return DashboardStats(
                 total_sites=0,
                 total_interactions=0,
@@ -444,60 +618,150 @@ class DatabaseService:
             )
     
     # Utility methods
+    async def invalidate_shared_site_config(self, site_id: str):
+        """Drop a site config from Redis and tell the other workers to forget it."""
+        if self.redis is None:
+            return
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.incr(f"cfg-version:{site_id}")
+                pipe.delete(f"cfg:{site_id}")
+                pipe.publish(SITE_CONFIG_INVALIDATION_CHANNEL, site_id)
+                await pipe.execute()
+        except Exception as e:
+            logger.error("Error invalidating shared site config: %s", e)
+    
+    async def listen_for_site_config_invalidations(self):
+        """Evict local sites and site configs changed by other workers."""
+        if self.redis is None:
+            return
+        while True:
+            try:
+                async with self.redis.pubsub() as pubsub:
+                    await pubsub.subscribe(SITE_CONFIG_INVALIDATION_CHANNEL)
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            self.invalidate_site(message["data"].decode())
+            except Exception as e:
+                logger.error("Site config invalidation listener error: %s", e)
+                await asyncio.sleep(5)
+    
+    def forget_site_config(self, site_id: str):
+        """Drop a site config from this worker, including any load already in flight."""
+        self.site_config_cache.pop(site_id, None)
+        # The in-flight load may have read the old config; it still answers its
+        # waiters but no longer fills the cache
+        self.site_config_loads.pop(site_id, None)
+    
     async def get_site_config(self, site_id: str) -> Optional[Dict[str, Any]]:
         """Get site configuration for widget."""
+        while True:
+            if site_id in self.site_config_cache:
+                return self.site_config_cache[site_id]
+            
+            # Concurrent misses for the same site share one load
+            pending = self.site_config_loads.get(site_id)
+            if pending is None:
+                break
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                # Only the load's own request went away; this one tries again itself
+                if not pending.cancelled():
+                    raise
+        
+        pending = asyncio.get_running_loop().create_future()
+        self.site_config_loads[site_id] = pending
         try:
-            site_data = self.sites.find_one({"id": site_id, "is_active": True})
-            if site_data:
-                return {
-                    "site_id": site_data["id"],
-                    "greeting_message": site_data["greeting_message"],
-                    "bot_name": site_data["bot_name"],
-                    "theme": site_data["theme"],
-                    "position": site_data["position"],
-                    "auto_greet": site_data["auto_greet"],
-                    "voice_enabled": site_data["voice_enabled"],
-                    "language": site_data["language"]
-                }
-            return None
+            config = await self.load_site_config(site_id)
+            if self.site_config_loads.get(site_id) is pending:
+                self.site_config_cache[site_id] = config
+            pending.set_result(config)
+            return config
+        except asyncio.CancelledError:
+            pending.cancel()
+            raise
         except Exception as e:
-            logger.error(f"Error getting site config: {e}")
-            return None
+            pending.set_exception(e)
+            pending.exception()  # Mark as retrieved in case nobody joined
+            raise
+        finally:
+            if self.site_config_loads.get(site_id) is pending:
+                del self.site_config_loads[site_id]
+    
+    async def load_site_config(self, site_id: str) -> Optional[Dict[str, Any]]:
+        """Load a site config from Redis, or from Mongo and share it through Redis."""
+        version = b"0"
+        if self.redis is not None:
+            try:
+                cached, stored_version = await self.redis.mget(f"cfg:{site_id}", f"cfg-version:{site_id}")
+                if cached is not None:
+                    return orjson.loads(cached)
+                version = stored_version or version
+            except Exception as e:
+                logger.error("Error reading shared site config: %s", e)
+        
+        # Mongo errors propagate, so a failed read is never cached as a missing site
+        site_data = await self.sites.find_one({"id": site_id, "is_active": True})
+        config = None
+        if site_data:
+            config = {
+                "site_id": site_data["id"],
+                "greeting_message": site_data["greeting_message"],
+                "bot_name": site_data["bot_name"],
+                "theme": site_data["theme"],
+                "position": site_data["position"],
+                "auto_greet": site_data["auto_greet"],
+                "voice_enabled": site_data["voice_enabled"],
+                "language": site_data["language"]
+            }
+        if self.redis is not None:
+            try:
+                await self.store_site_config_script(
+                    keys=[f"cfg:{site_id}", f"cfg-version:{site_id}"],
+                    args=[version, orjson.dumps(config), SHARED_SITE_CONFIG_TTL_SECONDS]
+                )
+            except Exception as e:
+                logger.error("Error storing shared site config: %s", e)
+        return config
     
     # Website Intelligence Methods
     async def store_site_structure(self, structure_data: Dict[str, Any]) -> bool:
         """Store website intelligence data."""
         try:
             # Update or insert site intelligence
-            result = self.site_intelligence.update_one(
-                {"site_id": structure_data.get("site_id", structure_data["domain"])},
+            site_id = structure_data.get("site_id", structure_data["domain"])
+            result = await self.site_intelligence.update_one(
+                {"site_id": site_id},
                 {"$set": structure_data},
                 upsert=True
             )
+            self.site_intelligence_cache.pop(site_id, None)
             return bool(result.upserted_id or result.modified_count)
         except Exception as e:
-            logger.error(f"Error storing site structure: {e}")
+            logger.error("Error storing site structure: %s", e)
             return False
     
     async def get_site_intelligence(self, site_id: str) -> Optional[Dict[str, Any]]:
         """Get website intelligence data for a site."""
+        if site_id in self.site_intelligence_cache:
+            return self.site_intelligence_cache[site_id]
+        
         try:
-            intelligence_data = self.site_intelligence.find_one({"site_id": site_id})
-            if intelligence_data:
-                intelligence_data.pop('_id', None)
-                return intelligence_data
-            return None
+            intelligence_data = await self.site_intelligence.find_one({"site_id": site_id}, {"_id": 0})
+            self.site_intelligence_cache[site_id] = intelligence_data or None
+            return intelligence_data or None
         except Exception as e:
-            logger.error(f"Error getting site intelligence: {e}")
+            logger.error("Error getting site intelligence: %s", e)
             return None
     
     async def store_user_journey(self, journey_data: Dict[str, Any]) -> bool:
         """Store user journey data."""
         try:
-            result = self.user_journeys.insert_one(journey_data)
+            result = await self.user_journeys.insert_one(journey_data)
             return bool(result.inserted_id)
         except Exception as e:
-            logger.error(f"Error storing user journey: {e}")
+            logger.error("Error storing user journey: %s", e)
             return False
     
     async def get_user_journeys(self, site_id: str, visitor_id: Optional[str] = None, days: int = 30) -> List[Dict[str, Any]]:
@@ -510,7 +774,7 @@ class DatabaseService:
             start_date = datetime.utcnow() - timedelta(days=days)
             query["timestamp"] = {"$gte": start_date}
             
-            journeys = list(self.user_journeys.find(query).sort("timestamp", DESCENDING).limit(100))
+            journeys = await self.user_journeys.find(query).sort("timestamp", DESCENDING).limit(100).to_list(None)
             
             # Remove MongoDB ObjectIds
             for journey in journeys:
@@ -518,16 +782,16 @@ class DatabaseService:
             
             return journeys
         except Exception as e:
-            logger.error(f"Error getting user journeys: {e}")
+            logger.error("Error getting user journeys: %s", e)
             return []
     
     async def store_intent_analysis(self, intent_data: Dict[str, Any]) -> bool:
         """Store intent analysis data."""
         try:
-            result = self.intent_analysis.insert_one(intent_data)
+            result = await self.intent_analysis.insert_one(intent_data)
             return bool(result.inserted_id)
         except Exception as e:
-            logger.error(f"Error storing intent analysis: {e}")
+            logger.error("Error storing intent analysis: %s", e)
             return False
     
     async def get_intent_analytics(self, site_id: str, days: int = 30) -> Dict[str, Any]:
@@ -547,7 +811,7 @@ class DatabaseService:
                 {"$sort": {"count": -1}}
             ]
             
-            intent_distribution = list(self.intent_analysis.aggregate(intent_pipeline))
+            intent_distribution = await self.intent_analysis.aggregate(intent_pipeline).to_list(None)
             
             # Get journey stage distribution
             journey_pipeline = [
@@ -559,10 +823,10 @@ class DatabaseService:
                 {"$sort": {"count": -1}}
             ]
             
-            journey_distribution = list(self.intent_analysis.aggregate(journey_pipeline))
+            journey_distribution = await self.intent_analysis.aggregate(journey_pipeline).to_list(None)
             
             # Calculate average confidence and conversion probability
-            avg_stats = list(self.intent_analysis.aggregate([
+            avg_stats = await self.intent_analysis.aggregate([
                 {"$match": {"site_id": site_id, "timestamp": {"$gte": start_date}}},
                 {"$group": {
                     "_id": None,
@@ -570,7 +834,7 @@ class DatabaseService:
                     "avg_conversion_prob": {"$avg": "$conversion_probability"},
                     "total_queries": {"$sum": 1}
                 }}
-            ]))
+            ]).to_list(None)
             
             avg_confidence = avg_stats[0]["avg_confidence"] if avg_stats else 0
             avg_conversion_prob = avg_stats[0]["avg_conversion_prob"] if avg_stats else 0
@@ -590,16 +854,16 @@ class DatabaseService:
                 }
             }
         except Exception as e:
-            logger.error(f"Error getting intent analytics: {e}")
+            logger.error("Error getting intent analytics: %s", e)
             return {}
     
     async def store_navigation_suggestion(self, suggestion_data: Dict[str, Any]) -> bool:
         """Store navigation suggestion data."""
         try:
-            result = self.navigation_suggestions.insert_one(suggestion_data)
+            result = await self.navigation_suggestions.insert_one(suggestion_data)
             return bool(result.inserted_id)
         except Exception as e:
-            logger.error(f"Error storing navigation suggestion: {e}")
+            logger.error("Error storing navigation suggestion: %s", e)
             return False
     
     async def get_navigation_analytics(self, site_id: str, days: int = 30) -> Dict[str, Any]:
@@ -608,12 +872,12 @@ class DatabaseService:
             start_date = datetime.utcnow() - timedelta(days=days)
             
             # Get most requested pages/queries
-            popular_queries = list(self.navigation_suggestions.aggregate([
+            popular_queries = await self.navigation_suggestions.aggregate([
                 {"$match": {"site_id": site_id, "timestamp": {"$gte": start_date}}},
                 {"$group": {"_id": "$query", "count": {"$sum": 1}}},
                 {"$sort": {"count": -1}},
                 {"$limit": 10}
-            ]))
+            ]).to_list(None)
             
             # Get success rate of suggestions
             success_pipeline = [
@@ -625,7 +889,7 @@ class DatabaseService:
                 }}
             ]
             
-            success_stats = list(self.navigation_suggestions.aggregate(success_pipeline))
+            success_stats = await self.navigation_suggestions.aggregate(success_pipeline).to_list(None)
             avg_success_prob = success_stats[0]["avg_success_prob"] if success_stats else 0
             total_suggestions = success_stats[0]["total_suggestions"] if success_stats else 0
             
@@ -638,7 +902,7 @@ class DatabaseService:
                 }
             }
         except Exception as e:
-            logger.error(f"Error getting navigation analytics: {e}")
+            logger.error("Error getting navigation analytics: %s", e)
             return {}
     
     async def generate_roi_report(self, site_id: str, days: int = 30) -> Dict[str, Any]:
@@ -650,7 +914,7 @@ class DatabaseService:
             site_analytics = await self.get_site_analytics(site_id, days)
             
             # Get AI-specific metrics
-            ai_interactions = self.interactions.count_documents({
+            ai_interactions = await self.interactions.count_documents({
                 "site_id": site_id,
                 "interaction_type": {"$in": ["ai_response", "voice_input", "text_input"]},
                 "timestamp": {"$gte": start_date}
@@ -679,7 +943,7 @@ class DatabaseService:
                 }}
             ]
             
-            satisfaction_stats = list(self.conversations.aggregate(satisfaction_pipeline))
+            satisfaction_stats = await self.conversations.aggregate(satisfaction_pipeline).to_list(None)
             if satisfaction_stats:
                 completion_rate = (satisfaction_stats[0]["completed_conversations"] / 
                                  satisfaction_stats[0]["total_interactions"]) * 100
@@ -745,22 +1009,22 @@ class DatabaseService:
             return roi_report
             
         except Exception as e:
-            logger.error(f"Error generating ROI report: {e}")
+            logger.error("Error generating ROI report: %s", e)
             return {}
     
     async def store_roi_report(self, report_data: Dict[str, Any]) -> bool:
         """Store ROI report."""
         try:
-            result = self.roi_reports.insert_one(report_data)
+            result = await self.roi_reports.insert_one(report_data)
             return bool(result.inserted_id)
         except Exception as e:
-            logger.error(f"Error storing ROI report: {e}")
+            logger.error("Error storing ROI report: %s", e)
             return False
     
     async def get_latest_roi_report(self, site_id: str) -> Optional[Dict[str, Any]]:
         """Get the latest ROI report for a site."""
         try:
-            report = self.roi_reports.find_one(
+            report = await self.roi_reports.find_one(
                 {"site_id": site_id},
                 sort=[("generated_at", DESCENDING)]
             )
@@ -769,5 +1033,5 @@ class DatabaseService:
                 return report
             return None
         except Exception as e:
-            logger.error(f"Error getting latest ROI report: {e}")
+            logger.error("Error getting latest ROI report: %s", e)
             return None
\ No newline at end of file
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, ConfigDict, EmailStr, Field
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 import uuid
@@ -43,6 +43,8 @@ class PasswordReset(BaseModel):
 
 # Site Models
 class SiteTheme(BaseModel):
+    model_config = ConfigDict(frozen=True)
+    
     primary_color: str = "#3B82F6"
     secondary_color: str = "#1E40AF"
     text_color: str = "#1F2937"
@@ -81,6 +83,8 @@ class SiteUpdate(BaseModel):
     is_active: Optional[bool] = None
 
 class SiteResponse(SiteBase):
+    model_config = ConfigDict(from_attributes=True, frozen=True)
+    
     id: str
     user_id: str
     created_at: datetime
@@ -89,7 +93,23 @@ class SiteResponse(SiteBase):
     total_conversations: int = 0
     last_interaction: Optional[datetime] = None
 
+# Chat Models
+class ChatRequest(BaseModel):
+    message: str = ""
+    session_id: Optional[str] = Field(default_factory=lambda: str(uuid.uuid4()))
+    site_id: str = "demo"
+    visitor_id: Optional[str] = None
+    platform: str = "unknown"
+    voice_mode: str = "full"
+
 # Analytics Models
+class InteractionLogRequest(BaseModel):
+    site_id: Optional[str] = None
+    session_id: Optional[str] = None
+    type: Optional[str] = None
+    user_message: Optional[str] = None
+    ai_response: Optional[str] = None
+
 class InteractionCreate(BaseModel):
     site_id: str
     session_id: str
@@ -125,6 +145,9 @@ class DashboardStats(BaseModel):
     site_performance: List[Dict[str, Any]]
 
 # Configuration Models
+class WidgetConfigRequest(BaseModel):
+    site_id: Optional[str] = None
+
 class WidgetConfig(BaseModel):
     site_id: str
     greeting_message: str
@@ -233,6 +256,8 @@ class NavigationSuggestion(BaseModel):
 
 # Database Models (for MongoDB)
 class UserDB(BaseModel):
+    model_config = ConfigDict(frozen=True)
+    
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     email: str
     full_name: str
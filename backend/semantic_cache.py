@@ -0,0 +1,103 @@
+"""
+Semantic Response Cache
+Reuses chat replies for messages that paraphrase an earlier question
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable, Optional, Tuple
+import numpy as np
+
+try:
+    from sentence_transformers import SentenceTransformer
+except ImportError:
+    SentenceTransformer = None
+
+logger = logging.getLogger(__name__)
+
+CacheEntry = Tuple[float, np.ndarray, str]
+
+class SemanticCache:
+    """Nearest-neighbour cache of AI replies keyed by message embeddings"""
+
+    def __init__(
+        self,
+        model_name: str = "sentence-transformers/all-MiniLM-L6-v2",
+        threshold: float = 0.92,
+        ttl_seconds: int = 3600,
+        max_entries_per_key: int = 1000,
+        max_keys: int = 1000,
+        active: bool = True
+    ):
+        self.model_name = model_name
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries_per_key = max_entries_per_key
+        self.max_keys = max_keys
+        self.model = None
+        self.model_lock = threading.Lock()
+        self.failed = not active
+        if active and SentenceTransformer is None:
+            logger.warning("Semantic cache requested but sentence-transformers is not installed")
+        self.buckets: "OrderedDict[Hashable, OrderedDict[str, CacheEntry]]" = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return SentenceTransformer is not None and not self.failed
+
+    def _encode(self, text: str) -> np.ndarray:
+        with self.model_lock:
+            if self.model is None:
+                self.model = SentenceTransformer(self.model_name)
+        return np.asarray(self.model.encode(text, normalize_embeddings=True), dtype=np.float32)
+
+    async def embed(self, text: str) -> Optional[np.ndarray]:
+        """Embed a message off the event loop; disables the cache if the model is unavailable"""
+        try:
+            return await asyncio.to_thread(self._encode, text)
+        except Exception as e:
+            logger.error("Semantic cache disabled, embedding failed: %s", e)
+            self.failed = True
+            return None
+
+    def lookup(self, key: Hashable, embedding: np.ndarray) -> Optional[str]:
+        """Return the cached reply most similar to the embedding if it clears the threshold"""
+        bucket = self.buckets.get(key)
+        if not bucket:
+            return None
+
+        now = time.monotonic()
+        for message, (created_at, _, _) in list(bucket.items()):
+            if now - created_at > self.ttl_seconds:
+                del bucket[message]
+        if not bucket:
+            del self.buckets[key]
+            return None
+
+        messages = list(bucket)
+        # Embeddings are normalized, so the dot product is the cosine similarity
+        scores = np.stack([bucket[message][1] for message in messages]) @ embedding
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            return None
+
+        bucket.move_to_end(messages[best])
+        self.buckets.move_to_end(key)
+        return bucket[messages[best]][2]
+
+    def store(self, key: Hashable, message: str, embedding: np.ndarray, response: str):
+        """Remember a reply, evicting the least recently used entries past capacity"""
+        bucket = self.buckets.setdefault(key, OrderedDict())
+        self.buckets.move_to_end(key)
+
+        normalized = " ".join(message.lower().split())
+        bucket[normalized] = (time.monotonic(), embedding, response)
+        bucket.move_to_end(normalized)
+
+        while len(bucket) > self.max_entries_per_key:
+            bucket.popitem(last=False)
+        while len(self.buckets) > self.max_keys:
+            self.buckets.popitem(last=False)
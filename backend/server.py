@@ -1,36 +1,45 @@
 from fastapi import FastAPI, HTTPException, Depends, Request, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi.responses import HTMLResponse, FileResponse, JSONResponse, ORJSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 # from starlette.middleware.base import BaseHTTPMiddleware  # Temporarily disabled
-from pymongo import MongoClient
-from groq import Groq
+from motor.motor_asyncio import AsyncIOMotorClient
+from groq import AsyncGroq
+from pymongo.errors import DuplicateKeyError
 import os
 from dotenv import load_dotenv
 import logging
+import logging.handlers
+import atexit
+import queue
 from typing import Optional, Dict, Any, List
 import json
+import orjson
 from datetime import datetime, timedelta
-import uuid
 import re
+import string
 import time
-from collections import defaultdict
+from collections import OrderedDict
+from cachetools import TTLCache, cached
 import asyncio
 
 import asyncio
 import aiohttp
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin, urlparse, parse_qs
-from typing import Dict, List, Set, Optional, Any, Tuple
+from typing import Dict, List, Set, Optional, Any, Tuple, Mapping, AsyncIterator
+from types import MappingProxyType
 import json
 import re
 from datetime import datetime, timedelta
-from collections import defaultdict, Counter
+from collections import Counter
 import textstat
 import logging
 from dataclasses import dataclass, asdict
 import hashlib
+import gzip
+from functools import lru_cache
 import nltk
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.cluster import KMeans
@@ -39,44 +48,351 @@ import numpy as np
 # Import new modules
 from models import *
 from auth import *
-from database import DatabaseService
-from website_intelligence import WebsiteIntelligenceEngine
+from database import BatchWriter, DatabaseService
+from website_intelligence import WebsiteIntelligenceEngine, create_crawler_session
+from semantic_cache import SemanticCache
 
 # Load environment variables
 load_dotenv()
 
 # Configure logging
+# Records are formatted by the queue handler and written to the file and stream by a
+# listener thread, so request handlers never block on log I/O
+log_queue: queue.SimpleQueue = queue.SimpleQueue()
+log_listener = logging.handlers.QueueListener(
+    log_queue,
+    logging.FileHandler('/var/log/supervisor/backend.log'),
+    logging.StreamHandler(),
+    respect_handler_level=True
+)
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('/var/log/supervisor/backend.log'),
-        logging.StreamHandler()
-    ]
+    handlers=[logging.handlers.QueueHandler(log_queue)]
 )
+log_listener.start()
+atexit.register(log_listener.stop)
 logger = logging.getLogger(__name__)
+logging.getLogger('pymongo').setLevel(logging.WARNING)  # Keep driver chatter out of the log file
+
+RATE_LIMIT_WINDOW_SECONDS = 60
+
+class RateLimitStore(OrderedDict):
+    """Per-IP request counters by endpoint, evicting the least recently seen IPs past max_ips"""
+    
+    def __init__(self, max_ips: int = 100_000):
+        super().__init__()
+        self.max_ips = max_ips
+        # Tracked (ip, endpoint) pairs, kept up to date so health checks don't walk every IP
+        self.active_endpoints = 0
+    
+    def __missing__(self, client_ip: str):
+        endpoints = self[client_ip] = {}
+        if len(self) > self.max_ips:
+            _, evicted = self.popitem(last=False)
+            self.active_endpoints -= len(evicted)
+        return endpoints
+    
+    def sweep(self, max_age: float = 120):
+        """Drop IPs with no requests inside max_age seconds"""
+        cutoff = time.monotonic() - max_age
+        stale_ips = [
+            client_ip for client_ip, endpoints in self.items()
+            if all((counter[0] + 1) * RATE_LIMIT_WINDOW_SECONDS < cutoff for counter in endpoints.values())
+        ]
+        for client_ip in stale_ips:
+            self.active_endpoints -= len(self.pop(client_ip))
 
 # Rate limiting storage
-rate_limits = defaultdict(lambda: defaultdict(list))
+RATE_LIMIT_SWEEP_INTERVAL = 60
+rate_limits = RateLimitStore()
+
+# In-flight chat requests, keyed by session and message, so duplicate submissions
+# (retries, double-clicks) share a single AI call
+_inflight_chats: Dict[str, asyncio.Future] = {}
 
 # Security configurations
 MAX_MESSAGE_LENGTH = 1000
 MAX_REQUESTS_PER_MINUTE = 200
 MAX_CHAT_REQUESTS_PER_MINUTE = 100
-BLOCKED_PATTERNS = [
+BLOCKED_PATTERNS = [re.compile(pattern, re.IGNORECASE | re.DOTALL) for pattern in (
     r'<script[^>]*>.*?</script>',
     r'javascript:',
     r'on\w+\s*=',
     r'eval\s*\(',
     r'document\.',
     r'window\.',
-]
+)]
+# Runs of repeated characters are found by has_repeated_run
+SPAM_PATTERNS = [re.compile(pattern) for pattern in (
+    r'[A-Z\s]{50,}',  # Excessive caps
+    r'(https?://\S+\s*){5,}',  # Multiple URLs
+)]
+PROFANITY_WORDS = ('fuck', 'shit', 'bitch', 'ass', 'damn')
+PROFANITY_PATTERN = re.compile(r'\b(?:' + '|'.join(map(re.escape, PROFANITY_WORDS)) + r')\b', re.IGNORECASE)
+
+try:
+    import hyperscan
+except ImportError:
+    hyperscan = None
+
+try:
+    import re2  # Linear-time matching when google-re2 is installed
+except ImportError:
+    re2 = None
+
+# Every blocked pattern as one alternation, so each cleaning pass over input and AI replies is a single scan
+BLOCKED_UNION_PATTERN = (re2 or re).compile(
+    '(?is)' + '|'.join(f'(?:{pattern.pattern})' for pattern in BLOCKED_PATTERNS)
+)
+
+def strip_blocked_patterns(text: str) -> str:
+    """Remove blocked patterns, repeating until none are left"""
+    # Removing one match can join its neighbours into another, as in
+    # 'docu<script></script>ment.cookie', so a single pass isn't enough
+    while True:
+        text, removed = BLOCKED_UNION_PATTERN.subn('', text)
+        if not removed:
+            return text
+
+BACKREFERENCE_PATTERN = re.compile(r'\\\d')
+
+class PatternScanner:
+    """Checks text against a set of compiled regexes in one Hyperscan pass, falling back to re2 or re"""
+    
+    def __init__(self, patterns: List[re.Pattern]):
+        self.database = None
+        self.fallback_patterns = patterns
+        
+        # Neither Hyperscan nor re2 supports backreferences, so those patterns stay on re
+        supported = [pattern for pattern in patterns if not BACKREFERENCE_PATTERN.search(pattern.pattern)]
+        if hyperscan is None:
+            if re2 is not None and supported:
+                self._use_re2(patterns, supported)
+            return
+        
+        flags = []
+        for pattern in supported:
+            pattern_flags = hyperscan.HS_FLAG_UTF8 | hyperscan.HS_FLAG_UCP | hyperscan.HS_FLAG_SINGLEMATCH
+            if pattern.flags & re.IGNORECASE:
+                pattern_flags |= hyperscan.HS_FLAG_CASELESS
+            if pattern.flags & re.DOTALL:
+                pattern_flags |= hyperscan.HS_FLAG_DOTALL
+            flags.append(pattern_flags)
+        
+        try:
+            database = hyperscan.Database()
+            database.compile(
+                expressions=[pattern.pattern.encode() for pattern in supported],
+                ids=list(range(len(supported))),
+                flags=flags
+            )
+        except Exception as e:
+            logger.warning("Hyperscan compile failed, using re: %s", e)
+            return
+        
+        self.database = database
+        self.fallback_patterns = [pattern for pattern in patterns if pattern not in supported]
+    
+    def _use_re2(self, patterns: List[re.Pattern], supported: List[re.Pattern]):
+        # One linear-time pass over every supported pattern, each keeping its own flags
+        alternatives = []
+        for pattern in supported:
+            inline_flags = ('i' if pattern.flags & re.IGNORECASE else '') + ('s' if pattern.flags & re.DOTALL else '')
+            alternatives.append(f'(?{inline_flags}:{pattern.pattern})' if inline_flags else f'(?:{pattern.pattern})')
+        try:
+            union = re2.compile('|'.join(alternatives))
+        except Exception as e:
+            logger.warning("re2 compile failed, using re: %s", e)
+            return
+        self.fallback_patterns = [pattern for pattern in patterns if pattern not in supported] + [union]
+    
+    def search(self, text: str) -> bool:
+        """Return True if any pattern matches the text"""
+        if any(pattern.search(text) for pattern in self.fallback_patterns):
+            return True
+        if self.database is None:
+            return False
+        
+        try:
+            data = text.encode()
+        except UnicodeEncodeError:
+            return True
+        
+        matched = []
+        self.database.scan(data, match_event_handler=lambda *args: matched.append(args[0]))
+        return bool(matched)
+
+BLOCKED_SCANNER = PatternScanner(BLOCKED_PATTERNS)
+SPAM_SCANNER = PatternScanner(SPAM_PATTERNS)
+SPAM_REPEAT_MIN_LENGTH = 11
+SPAM_CAPS_MIN_LENGTH = 50
+
+def has_repeated_run(text: str, run_length: int = SPAM_REPEAT_MIN_LENGTH) -> bool:
+    """Return True if a character other than a newline repeats run_length times in a row"""
+    # Any such run covers an index that is a multiple of run_length, so only those
+    # indexes are checked, each extended in both directions
+    length = len(text)
+    for index in range(0, length, run_length):
+        char = text[index]
+        if char == '\n':
+            continue
+        start = index
+        while start > 0 and text[start - 1] == char:
+            start -= 1
+        end = index + 1
+        while end < length and text[end] == char:
+            end += 1
+        if end - start >= run_length:
+            return True
+    return False
+
+# Every blocked pattern needs one of these substrings, so ASCII text without any
+# of them skips the regex scan. Non-ASCII text always scans, since re's case
+# folding matches characters such as 'ſ' and 'İ' that str.lower() leaves alone.
+BLOCKED_SCREEN_TOKENS = ('<script', 'javascript:', '=', 'eval', 'document.', 'window.')
+
+def has_blocked_content(text: str) -> bool:
+    """Return True if the text matches any blocked pattern"""
+    if text.isascii():
+        lowered = text.lower()
+        if not any(token in lowered for token in BLOCKED_SCREEN_TOKENS):
+            return False
+    return BLOCKED_SCANNER.search(text)
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+class KeywordClassifier:
+    """Finds the highest-priority keyword category occurring in a text, in a single Aho-Corasick pass"""
+    
+    def __init__(self, categories: List[Tuple[str, List[str]]]):
+        self.categories = [(name, tuple(words)) for name, words in categories]
+        self.automaton = None
+        if ahocorasick is None:
+            return
+        
+        automaton = ahocorasick.Automaton()
+        for priority, (_, words) in enumerate(self.categories):
+            for word in words:
+                # A keyword listed under several categories belongs to the earliest one
+                if not automaton.exists(word):
+                    automaton.add_word(word, priority)
+        automaton.make_automaton()
+        self.automaton = automaton
+    
+    def first_match(self, text: str) -> Optional[str]:
+        """Return the first category, in priority order, with a keyword anywhere in the text"""
+        if self.automaton is None:
+            for name, words in self.categories:
+                if any(word in text for word in words):
+                    return name
+            return None
+        
+        best = min((priority for _, priority in self.automaton.iter(text)), default=None)
+        return None if best is None else self.categories[best][0]
+    
+    def all_matches(self, text: str) -> List[str]:
+        """Return every category with a keyword in the text, in priority order"""
+        if self.automaton is None:
+            return [name for name, words in self.categories if any(word in text for word in words)]
+        
+        found = {priority for _, priority in self.automaton.iter(text)}
+        return [self.categories[priority][0] for priority in sorted(found)]
+
+class WordMasker:
+    """Replaces whole-word occurrences of a word list, in a single Aho-Corasick pass"""
+    
+    def __init__(self, words: Tuple[str, ...], pattern: re.Pattern, replacement: str):
+        self.pattern = pattern
+        self.replacement = replacement
+        self.automaton = None
+        if ahocorasick is None:
+            return
+        
+        automaton = ahocorasick.Automaton()
+        for word in words:
+            automaton.add_word(word.lower(), len(word))
+        automaton.make_automaton()
+        self.automaton = automaton
+    
+    @staticmethod
+    def is_word_char(char: str) -> bool:
+        return char.isalnum() or char == '_'
+    
+    def sub(self, text: str) -> str:
+        """Mask every listed word that stands on word boundaries, matching case-insensitively"""
+        lowered = text.lower()
+        # Lowercasing a few characters changes the length, which would misalign the splice
+        if self.automaton is None or len(lowered) != len(text):
+            return self.pattern.sub(self.replacement, text)
+        
+        parts = []
+        last = 0
+        for end, length in self.automaton.iter(lowered):
+            start = end - length + 1
+            if start < last:
+                continue
+            if start > 0 and self.is_word_char(lowered[start - 1]):
+                continue
+            if end + 1 < len(lowered) and self.is_word_char(lowered[end + 1]):
+                continue
+            parts.append(text[last:start])
+            parts.append(self.replacement)
+            last = end + 1
+        
+        if not parts:
+            return text
+        parts.append(text[last:])
+        return "".join(parts)
+
+PROFANITY_MASKER = WordMasker(PROFANITY_WORDS, PROFANITY_PATTERN, '[filtered]')
+
+# Bound concurrent GROQ calls per worker; requests that cannot get a slot quickly receive a 429
+GROQ_CONCURRENCY = int(os.getenv("GROQ_CONCURRENCY", "8"))
+GROQ_ACQUIRE_TIMEOUT = 0.5
+groq_semaphore = asyncio.Semaphore(GROQ_CONCURRENCY)
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import psutil
+    psutil.cpu_percent(interval=None)  # Prime the counter so later calls measure since the last one
+except ImportError:
+    psutil = None
+
+# Token accounting for GROQ context trimming and usage logging
+HISTORY_TOKEN_BUDGET = 6000
+CHARS_PER_TOKEN = 4  # Rough average for English text, used when exact counts aren't needed
+try:
+    import tiktoken
+    token_encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:  # tiktoken not installed or encoding files unavailable
+    token_encoding = None
+
+# Replies for byte-identical GROQ requests, checked before the semantic cache. Only
+# deterministic (temperature 0) replies are reused unless a deployment opts in to
+# serving one sampled reply for every identical request
+PROMPT_CACHE_TTL_SECONDS = 7 * 24 * 3600
+PROMPT_CACHE_SAMPLED_REPLIES = os.getenv("PROMPT_CACHE_SAMPLED_REPLIES", "false").lower() == "true"
+prompt_cache: TTLCache = TTLCache(maxsize=10_000, ttl=PROMPT_CACHE_TTL_SECONDS)
+
+# Paraphrase cache for opening chat messages; opt-in because it needs
+# sentence-transformers (and torch), which requirements.txt leaves out
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+semantic_cache = SemanticCache(active=SEMANTIC_CACHE_ENABLED)
 
 # Initialize FastAPI app
 app = FastAPI(
     title="AI Voice Assistant API", 
     version="1.0.0",
-    description="Production-ready AI Voice Assistant API with enhanced security"
+    description="Production-ready AI Voice Assistant API with enhanced security",
+    default_response_class=ORJSONResponse
 )
 
 # Mount static files for widget assets
@@ -99,94 +415,129 @@ def get_client_ip(request: Request) -> str:
     """Get client IP address from request"""
     forwarded = request.headers.get("X-Forwarded-For")
     if forwarded:
-        return forwarded.split(",")[0].strip()
+        # Only the first hop is needed, so slice it off instead of splitting the chain
+        comma = forwarded.find(",")
+        return (forwarded[:comma] if comma >= 0 else forwarded).strip()
     return request.client.host
 
+def sliding_window_count(counter: List[float], window: float, elapsed: float) -> float:
+    """Estimate requests in the last minute from a [window, count, previous count] counter"""
+    # The previous window counts for the share of it that still falls inside the last minute
+    overlap = 1 - elapsed / RATE_LIMIT_WINDOW_SECONDS
+    if counter[0] == window:
+        return counter[1] + counter[2] * overlap
+    if counter[0] == window - 1:
+        return counter[1] * overlap
+    return 0
+
+def remaining_requests(client_ip: str, endpoint: str, max_requests: int) -> int:
+    """Requests left for a client this minute, without creating a counter"""
+    # The IP may have been evicted or swept while the request was being handled
+    counter = rate_limits.get(client_ip, {}).get(endpoint)
+    if counter is None:
+        return max_requests
+    return max_requests - int(sliding_window_count(counter, *divmod(time.monotonic(), RATE_LIMIT_WINDOW_SECONDS)))
+
 def is_rate_limited(client_ip: str, endpoint: str, max_requests: int = MAX_REQUESTS_PER_MINUTE) -> bool:
     """Check if client IP is rate limited for specific endpoint"""
-    current_time = time.time()
-    minute_ago = current_time - 60
-    
-    # Clean old entries
-    rate_limits[client_ip][endpoint] = [
-        req_time for req_time in rate_limits[client_ip][endpoint] 
-        if req_time > minute_ago
-    ]
-    
-    # Check if rate limit exceeded
-    if len(rate_limits[client_ip][endpoint]) >= max_requests:
+    window, elapsed = divmod(time.monotonic(), RATE_LIMIT_WINDOW_SECONDS)
+    
+    client_limits = rate_limits[client_ip]
+    rate_limits.move_to_end(client_ip)
+    
+    # Each endpoint keeps [window, count, previous window count] instead of one
+    # timestamp per request
+    counter = client_limits.get(endpoint)
+    if counter is None:
+        counter = client_limits[endpoint] = [window, 0, 0]
+        rate_limits.active_endpoints += 1
+    elif counter[0] != window:
+        counter[2] = counter[1] if counter[0] == window - 1 else 0
+        counter[0] = window
+        counter[1] = 0
+    
+    if sliding_window_count(counter, window, elapsed) >= max_requests:
         return True
     
-    # Add current request
-    rate_limits[client_ip][endpoint].append(current_time)
+    counter[1] += 1
     return False
 
+async def sweep_rate_limits_periodically():
+    """Forget clients that have stopped sending requests"""
+    while True:
+        await asyncio.sleep(RATE_LIMIT_SWEEP_INTERVAL)
+        rate_limits.sweep()
+
 def sanitize_input(text: str) -> str:
     """Sanitize user input to prevent XSS and injection attacks"""
     if not text:
         return ""
     
-    # Remove potentially dangerous patterns
-    for pattern in BLOCKED_PATTERNS:
-        text = re.sub(pattern, '', text, flags=re.IGNORECASE)
+    # Remove potentially dangerous patterns; clean text skips the rewrite
+    if has_blocked_content(text):
+        text = strip_blocked_patterns(text)
     
     # Limit length
     if len(text) > MAX_MESSAGE_LENGTH:
         text = text[:MAX_MESSAGE_LENGTH]
     
     # Remove excessive whitespace
-    text = re.sub(r'\s+', ' ', text).strip()
+    text = ' '.join(text.split())
     
     return text
 
 def validate_message_content(message: str) -> bool:
     """Validate message content for safety"""
-    if not message or len(message.strip()) == 0:
+    # Cheapest checks first; isspace() avoids building a stripped copy
+    length = len(message)
+    if length == 0 or length > MAX_MESSAGE_LENGTH or message.isspace():
         return False
     
-    if len(message) > MAX_MESSAGE_LENGTH:
+    # Check for spam patterns; messages too short for any of them skip the scan
+    if length < SPAM_REPEAT_MIN_LENGTH:
+        return True
+    if has_repeated_run(message):
+        return False
+    if length < SPAM_CAPS_MIN_LENGTH and '://' not in message:
+        return True
+    if SPAM_SCANNER.search(message):
         return False
-    
-    # Check for spam patterns
-    spam_patterns = [
-        r'(.)\1{10,}',  # Repeated characters
-        r'[A-Z\s]{50,}',  # Excessive caps
-        r'(https?://\S+\s*){5,}',  # Multiple URLs
-    ]
-    
-    for pattern in spam_patterns:
-        if re.search(pattern, message):
-            return False
     
     return True
 
-# Security middleware - temporarily disabled
-# async def security_middleware(request: Request, call_next):
-#     """Security middleware for request validation"""
-#     start_time = time.time()
-#     
-#     # Get client IP
-#     client_ip = get_client_ip(request)
-#     
-#     # Check rate limiting for API endpoints
-#     if request.url.path.startswith("/api/"):
-#         endpoint = request.url.path
-#         max_requests = MAX_CHAT_REQUESTS_PER_MINUTE if "/chat" in endpoint else MAX_REQUESTS_PER_MINUTE
-#         
-#         if is_rate_limited(client_ip, endpoint, max_requests):
-#             logger.warning(f"Rate limit exceeded for {client_ip} on {endpoint}")
-#             raise HTTPException(
-#                 status_code=429,
-#                 detail="Rate limit exceeded. Please try again later."
-#             )
-#     
-#     response = await call_next(request)
-#     
-#     # Log request
-#     process_time = time.time() - start_time
-#     logger.info(f"{client_ip} - {request.method} {request.url.path} - {response.status_code} - {process_time:.3f}s")
-#     
-#     return response
+# Security middleware - defined here, registration below is temporarily disabled
+async def security_middleware(request: Request, call_next):
+    """Security middleware for request validation"""
+    # Liveness probes bypass rate limiting and logging
+    if request.url.path == "/api/status":
+        return await call_next(request)
+    
+    start_time = time.time()
+    
+    # Get client IP
+    client_ip = get_client_ip(request)
+    
+    # Check rate limiting for API endpoints
+    if request.url.path.startswith("/api/"):
+        endpoint = request.url.path
+        max_requests = MAX_CHAT_REQUESTS_PER_MINUTE if "/chat" in endpoint else MAX_REQUESTS_PER_MINUTE
+        
+        if is_rate_limited(client_ip, endpoint, max_requests):
+            logger.warning("Rate limit exceeded for %s on %s", client_ip, endpoint)
+            # Middleware runs outside the exception handlers, so respond directly instead of raising
+            return JSONResponse(
+                status_code=429,
+                content={"detail": "Rate limit exceeded. Please try again later."},
+                headers={"Retry-After": "60"}
+            )
+    
+    response = await call_next(request)
+    
+    # Log request
+    process_time = time.time() - start_time
+    logger.info("%s - %s %s - %s - %.3fs", client_ip, request.method, request.url.path, response.status_code, process_time)
+    
+    return response
 
 # Security middleware class - temporarily disabled
 # class SecurityMiddleware(BaseHTTPMiddleware):
@@ -197,35 +548,112 @@ def validate_message_content(message: str) -> bool:
 # app.add_middleware(SecurityMiddleware)
 
 # Initialize MongoDB connection
+# The connection budget is shared by every worker process, so each pool gets its slice;
+# it must stay above the number of requests a worker serves concurrently
+MONGO_MAX_CONNECTIONS = int(os.getenv("MONGO_MAX_CONNECTIONS", "200"))
+MONGO_POOL_SIZE = max(10, MONGO_MAX_CONNECTIONS // int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)))
+
 try:
-    mongo_client = MongoClient(os.getenv("MONGO_URL"))
+    mongo_client = AsyncIOMotorClient(
+        os.getenv("MONGO_URL"),
+        maxPoolSize=MONGO_POOL_SIZE,
+        minPoolSize=min(10, MONGO_POOL_SIZE),
+        maxIdleTimeMS=300_000,
+        waitQueueTimeoutMS=2000
+    )
     db = mongo_client.ai_voice_assistant
-    # Test connection
-    mongo_client.admin.command('ping')
-    logger.info("MongoDB connected successfully")
     
     # Initialize database service
-    db_service = DatabaseService(mongo_client)
+    db_service = DatabaseService(mongo_client, redis_url=os.getenv("REDIS_URL"))
 except Exception as e:
-    logger.error(f"MongoDB connection failed: {e}")
+    logger.error("MongoDB connection failed: %s", e)
     db = None
     db_service = None
 
+# Conversation and interaction logs are queued and written in batches off the request path
+conversation_writer: Optional[BatchWriter] = None
+interaction_writer: Optional[BatchWriter] = None
+
+# Strong references to long-running background tasks
+background_tasks: Set[asyncio.Task] = set()
+
+def start_background_task(coro) -> asyncio.Task:
+    """Schedule a coroutine and keep it referenced until it finishes"""
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+@app.on_event("startup")
+async def connect_database():
+    """Verify the MongoDB connection and prepare indexes once the event loop is running"""
+    global db, db_service, conversation_writer, interaction_writer
+    if db_service is None:
+        return
+    try:
+        # Test connection
+        await mongo_client.admin.command('ping')
+        logger.info("MongoDB connected successfully")
+    except Exception as e:
+        logger.error("MongoDB connection failed: %s", e)
+        db = None
+        db_service = None
+        return
+    
+    await db_service.create_indexes()
+    start_background_task(db_service.listen_for_site_config_invalidations())
+    
+    conversation_writer = BatchWriter(db.conversations)
+    start_background_task(conversation_writer.run())
+    # Interactions are built from InteractionDB, so server-side validation is skipped
+    interaction_writer = BatchWriter(db.interactions, max_batch=500, bypass_validation=True)
+    start_background_task(interaction_writer.run())
+
+@app.on_event("shutdown")
+async def flush_conversation_writer():
+    if conversation_writer:
+        await conversation_writer.drain()
+    if interaction_writer:
+        await interaction_writer.drain()
+
+# One pooled HTTP session for outbound crawling, so connections and TLS sessions are reused
+crawler_session: Optional[aiohttp.ClientSession] = None
+
+@app.on_event("startup")
+async def open_crawler_session():
+    global crawler_session
+    crawler_session = create_crawler_session()
+
+@app.on_event("shutdown")
+async def close_crawler_session():
+    if crawler_session:
+        await crawler_session.close()
+
+@app.on_event("startup")
+async def start_rate_limit_sweeper():
+    start_background_task(sweep_rate_limits_periodically())
+
 # Initialize GROQ client
 try:
     groq_api_key = os.getenv("GROQ_API_KEY")
     if groq_api_key:
         # Set the API key as environment variable for GROQ client
         os.environ["GROQ_API_KEY"] = groq_api_key
-        groq_client = Groq()
+        groq_client = AsyncGroq()
         logger.info("GROQ client initialized successfully")
     else:
         logger.warning("GROQ_API_KEY not found in environment variables")
         groq_client = None
 except Exception as e:
-    logger.error(f"GROQ initialization failed: {e}")
+    logger.error("GROQ initialization failed: %s", e)
     groq_client = None
 
+# Sites with their own GROQ key reuse one client, and its connection pool, per key
+@lru_cache(maxsize=256)
+def get_groq_client(api_key: str) -> AsyncGroq:
+    """Get a shared GROQ client for a site-specific API key"""
+    return AsyncGroq(api_key=api_key)
+
 # Security
 security = HTTPBearer()
 
@@ -264,9 +692,35 @@ async def get_current_user_optional(credentials: Optional[HTTPAuthorizationCrede
 async def root():
     return {"message": "AI Voice Assistant API is running"}
 
+# Load balancers poll health often; reading /proc a few times a minute is plenty
+@cached(TTLCache(maxsize=1, ttl=5))
+def get_system_metrics() -> Dict[str, str]:
+    """Get memory and CPU usage for the health check"""
+    if psutil is None:
+        return {
+            "note": "psutil not available for system metrics"
+        }
+    
+    # Memory usage (simplified)
+    memory_info = psutil.virtual_memory()
+    return {
+        "memory_usage": f"{memory_info.percent}%",
+        "memory_available": f"{memory_info.available / (1024**3):.1f}GB",
+        "cpu_usage": f"{psutil.cpu_percent(interval=None)}%"
+    }
+
+# Detailed health is reused briefly so frequent readiness probes don't each ping Mongo
+HEALTH_CACHE_SECONDS = 5
+_health_cache: Tuple[float, Optional[Dict[str, Any]]] = (0.0, None)
+
 @app.get("/api/health")
 async def health_check():
     """Enhanced health check endpoint with detailed status"""
+    global _health_cache
+    cached_at, cached_status = _health_cache
+    if cached_status is not None and time.monotonic() - cached_at < HEALTH_CACHE_SECONDS:
+        return cached_status
+    
     health_status = {
         "status": "healthy",
         "timestamp": datetime.utcnow().isoformat(),
@@ -277,7 +731,7 @@ async def health_check():
     
     # MongoDB health check
     try:
-        mongo_client.admin.command('ping')
+        await mongo_client.admin.command('ping')
         health_status["services"]["mongodb"] = {
             "status": "connected",
             "response_time": "< 100ms"
@@ -308,71 +762,62 @@ async def health_check():
         }
     
     # System metrics
-    try:
-        # Memory usage (simplified)
-        import psutil
-        memory_info = psutil.virtual_memory()
-        health_status["metrics"] = {
-            "memory_usage": f"{memory_info.percent}%",
-            "memory_available": f"{memory_info.available / (1024**3):.1f}GB",
-            "cpu_usage": f"{psutil.cpu_percent()}%"
-        }
-    except ImportError:
-        health_status["metrics"] = {
-            "note": "psutil not available for system metrics"
-        }
+    health_status["metrics"] = get_system_metrics()
     
     # Rate limiting status
-    active_connections = sum(len(endpoints) for endpoints in rate_limits.values())
+    active_connections = rate_limits.active_endpoints
     health_status["rate_limiting"] = {
         "active_connections": active_connections,
         "max_requests_per_minute": MAX_REQUESTS_PER_MINUTE,
         "chat_requests_per_minute": MAX_CHAT_REQUESTS_PER_MINUTE
     }
     
+    _health_cache = (time.monotonic(), health_status)
     return health_status
 
 @app.get("/api/metrics")
 async def get_metrics():
     """Get application metrics for monitoring"""
     try:
-        if not db:
+        if db is None:
             return {"error": "Database not available"}
         
-        # Get basic metrics
-        total_conversations = db.conversations.count_documents({})
-        total_interactions = db.interactions.count_documents({})
-        
-        # Get hourly stats for last 24 hours
+        # Get hourly stats, model usage and error counts for the last 24 hours in one pass
         twenty_four_hours_ago = datetime.utcnow() - timedelta(hours=24)
         
-        hourly_conversations = list(db.conversations.aggregate([
-            {"$match": {"timestamp": {"$gte": twenty_four_hours_ago}}},
-            {"$group": {
-                "_id": {"$dateToString": {"format": "%Y-%m-%d %H:00", "date": "$timestamp"}},
-                "count": {"$sum": 1}
-            }},
-            {"$sort": {"_id": 1}}
-        ]))
-        
-        # Model usage stats
-        model_stats = list(db.conversations.aggregate([
-            {"$match": {"timestamp": {"$gte": twenty_four_hours_ago}}},
-            {"$group": {
-                "_id": "$model",
-                "count": {"$sum": 1}
-            }}
-        ]))
-        
-        # Error rate calculation
-        error_count = db.conversations.count_documents({
-            "timestamp": {"$gte": twenty_four_hours_ago},
-            "model": {"$regex": "fallback|demo"}
-        })
-        
-        total_last_24h = db.conversations.count_documents({
-            "timestamp": {"$gte": twenty_four_hours_ago}
-        })
+        total_conversations, total_interactions, last_24h = await asyncio.gather(
+            db.conversations.estimated_document_count(),
+            db.interactions.estimated_document_count(),
+            db.conversations.aggregate([
+                {"$match": {"timestamp": {"$gte": twenty_four_hours_ago}}},
+                {"$facet": {
+                    "hourly": [
+                        {"$group": {
+                            "_id": {"$dateToString": {"format": "%Y-%m-%d %H:00", "date": "$timestamp"}},
+                            "count": {"$sum": 1}
+                        }},
+                        {"$sort": {"_id": 1}}
+                    ],
+                    "models": [
+                        {"$group": {
+                            "_id": "$model",
+                            "count": {"$sum": 1}
+                        }}
+                    ],
+                    "total": [{"$count": "n"}]
+                }}
+            ]).to_list(1)
+        )
+        
+        facets = last_24h[0]
+        hourly_conversations = facets["hourly"]
+        model_stats = facets["models"]
+        total_last_24h = facets["total"][0]["n"] if facets["total"] else 0
+        # Demo and fallback replies are errors; the per-model counts already cover them
+        error_count = sum(
+            stat["count"] for stat in model_stats
+            if isinstance(stat["_id"], str) and ("fallback" in stat["_id"] or "demo" in stat["_id"])
+        )
         
         error_rate = (error_count / total_last_24h * 100) if total_last_24h > 0 else 0
         
@@ -390,22 +835,17 @@ async def get_metrics():
             },
             "rate_limiting": {
                 "active_ips": len(rate_limits),
-                "total_requests_tracked": sum(len(endpoints) for endpoints in rate_limits.values())
+                "total_requests_tracked": rate_limits.active_endpoints
             }
         }
     except Exception as e:
-        logger.error(f"Metrics error: {e}")
+        logger.error("Metrics error: %s", e)
         return {"error": str(e)}
 
 @app.get("/api/status")
 async def get_status():
-    """Simple status endpoint for load balancer health checks"""
-    try:
-        # Quick database ping
-        mongo_client.admin.command('ping')
-        return {"status": "ok", "timestamp": datetime.utcnow().isoformat()}
-    except:
-        return {"status": "error", "timestamp": datetime.utcnow().isoformat()}
+    """Simple liveness endpoint for load balancer health checks; does no I/O"""
+    return {"status": "ok", "timestamp": datetime.utcnow().isoformat()}
 
 @app.get("/api/embed.js")
 async def get_embed_script():
@@ -413,175 +853,338 @@ async def get_embed_script():
     try:
         return FileResponse("/app/backend/static/embed.js", media_type="text/javascript")
     except Exception as e:
-        logger.error(f"Embed script error: {e}")
+        logger.error("Embed script error: %s", e)
         raise HTTPException(status_code=404, detail="Embed script not found")
 
+def parse_chat_request(body: ChatRequest, request: Request) -> Dict[str, Any]:
+    """Sanitize and rate limit a chat request into generate_chat_response arguments"""
+    message = body.message.strip()
+    session_id = body.session_id
+    site_id = body.site_id
+    visitor_id = body.visitor_id
+    platform = body.platform
+    voice_mode = body.voice_mode
+    
+    # Input validation and sanitization
+    if not message:
+        raise HTTPException(status_code=400, detail="Message is required")
+    
+    # Sanitize input
+    message = sanitize_input(message)
+    
+    # Validate message content
+    if not validate_message_content(message):
+        raise HTTPException(status_code=400, detail="Invalid message content")
+    
+    # Platform-specific rate limiting
+    client_ip = get_client_ip(request)
+    rate_limit = MAX_CHAT_REQUESTS_PER_MINUTE // 2 if platform in ['ios', 'android'] else MAX_CHAT_REQUESTS_PER_MINUTE
+    
+    if is_rate_limited(client_ip, "chat", rate_limit):
+        raise HTTPException(status_code=429, detail="Chat rate limit exceeded")
+    
+    return {
+        "message": message,
+        "session_id": session_id,
+        "site_id": site_id,
+        "visitor_id": visitor_id,
+        "platform": platform,
+        "voice_mode": voice_mode,
+        "client_ip": client_ip,
+        "rate_limit": rate_limit
+    }
+
 @app.post("/api/chat")
-async def chat_with_ai(request: Request):
+async def chat_with_ai(body: ChatRequest, request: Request):
     """Main chat endpoint for the voice widget with 90-day conversation memory and platform optimization"""
     try:
-        body = await request.json()
-        message = body.get("message", "").strip()
-        session_id = body.get("session_id", str(uuid.uuid4()))
-        site_id = body.get("site_id", "demo")
-        visitor_id = body.get("visitor_id", None)
-        platform = body.get("platform", "unknown")
-        voice_mode = body.get("voice_mode", "full")
-        
-        # Input validation and sanitization
-        if not message:
-            raise HTTPException(status_code=400, detail="Message is required")
-        
-        # Sanitize input
-        message = sanitize_input(message)
-        
-        # Validate message content
-        if not validate_message_content(message):
-            raise HTTPException(status_code=400, detail="Invalid message content")
-        
-        # Platform-specific rate limiting
-        client_ip = get_client_ip(request)
-        rate_limit = MAX_CHAT_REQUESTS_PER_MINUTE // 2 if platform in ['ios', 'android'] else MAX_CHAT_REQUESTS_PER_MINUTE
-        
-        if is_rate_limited(client_ip, "chat", rate_limit):
-            raise HTTPException(status_code=429, detail="Chat rate limit exceeded")
-        
-        # Get site-specific configuration and intelligence
-        site_config = await get_site_configuration(site_id)
-        
-        # Get site intelligence for smarter responses
-        site_intelligence = None
-        if db_service:
-            intelligence_data = await db_service.get_site_intelligence(site_id)
-            if intelligence_data:
-                site_intelligence = intelligence_data
-        
-        # Get visitor's historical context (90 days)
-        visitor_context = await get_visitor_context(visitor_id, site_id) if visitor_id else None
-        
-        # AI Response logic with improved error handling and platform optimization
-        ai_response = ""
-        model_used = "demo"
+        chat = parse_chat_request(body, request)
+        
+        # Join an identical request that is already being answered
+        inflight_key = hashlib.blake2b(
+            f"{chat['session_id']}|{chat['site_id']}|{chat['message']}".encode(), digest_size=16
+        ).hexdigest()
+        while True:
+            pending = _inflight_chats.get(inflight_key)
+            if pending is None:
+                break
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                # Only the first request went away; this one answers itself
+                if not pending.cancelled():
+                    raise
+        
+        pending = asyncio.get_running_loop().create_future()
+        _inflight_chats[inflight_key] = pending
+        try:
+            response = await generate_chat_response(request, **chat)
+            pending.set_result(response)
+            return response
+        except asyncio.CancelledError:
+            pending.cancel()
+            raise
+        except Exception as e:
+            pending.set_exception(e)
+            pending.exception()  # Mark as retrieved in case nobody joined
+            raise
+        finally:
+            if _inflight_chats.get(inflight_key) is pending:
+                del _inflight_chats[inflight_key]
         
+    except HTTPException:
+        # Re-raise HTTP exceptions (like 400 for missing message)
+        raise
+    except Exception as e:
+        logger.error("Chat endpoint error: %s", e)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+def sse_event(payload: Dict[str, Any]) -> bytes:
+    """Encode a payload as a server-sent event"""
+    return b"data: " + orjson.dumps(payload) + b"\n\n"
+
+@app.post("/api/chat/stream")
+async def chat_with_ai_stream(body: ChatRequest, request: Request):
+    """Streaming variant of /api/chat that sends reply text as server-sent events while GROQ generates it"""
+    try:
+        chat = parse_chat_request(body, request)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Chat stream endpoint error: %s", e)
+        raise HTTPException(status_code=500, detail="Internal server error")
+    
+    deltas: asyncio.Queue = asyncio.Queue()
+    
+    async def produce():
         try:
-            if groq_client:
-                # Get recent conversation history for immediate context
-                conversation_history = await get_conversation_history(session_id, site_id)
-                
-                # Create conversation context with memory and platform awareness
-                conversation_context = [
-                    {
-                        "role": "system",
-                        "content": create_system_prompt_with_memory_and_platform(site_config, visitor_context, platform, voice_mode)
-                    }
-                ]
-                
-                # Add conversation history (last 8 messages for context)
-                for msg in conversation_history[-8:]:
-                    conversation_context.append({
-                        "role": "user",
-                        "content": msg["user_message"]
-                    })
-                    conversation_context.append({
-                        "role": "assistant",
-                        "content": msg["ai_response"]
-                    })
-                
-                # Add current message with enhanced context including site intelligence
-                enhanced_message = await enhance_ai_context_with_memory_and_intelligence(
-                    message, site_config, visitor_context, site_intelligence
-                )
+            return await generate_chat_response(request, **chat, stream_queue=deltas)
+        finally:
+            deltas.put_nowait(None)
+    
+    task = asyncio.create_task(produce())
+    
+    async def events():
+        try:
+            while (delta := await deltas.get()) is not None:
+                yield sse_event({"delta": delta})
+            
+            try:
+                response = await task
+            except HTTPException as e:
+                yield sse_event({"error": e.detail, "status_code": e.status_code})
+                return
+            except Exception as e:
+                logger.error("Chat stream endpoint error: %s", e)
+                yield sse_event({"error": "Internal server error", "status_code": 500})
+                return
+            
+            # The final event carries the filtered reply, which replaces the streamed draft
+            yield sse_event({"done": True, **response})
+        finally:
+            task.cancel()
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def get_site_intelligence_data(site_id: str) -> Optional[Dict[str, Any]]:
+    """Get stored website intelligence for smarter responses, if any"""
+    if not db_service:
+        return None
+    return await db_service.get_site_intelligence(site_id)
+
+async def generate_chat_response(
+    request: Request,
+    message: str,
+    session_id: str,
+    site_id: str,
+    visitor_id: Optional[str],
+    platform: str,
+    voice_mode: str,
+    client_ip: str,
+    rate_limit: int,
+    stream_queue: Optional[asyncio.Queue] = None
+) -> Dict[str, Any]:
+    """Generate the AI reply for a validated chat message and log the conversation"""
+    # Site configuration, site intelligence, the visitor's 90-day context and the
+    # session's recent history are independent, so they are fetched concurrently;
+    # each lookup handles its own errors
+    site_config, site_intelligence, visitor_context, conversation_history = await asyncio.gather(
+        get_site_configuration(site_id),
+        get_site_intelligence_data(site_id),
+        get_visitor_context(visitor_id, site_id),
+        get_conversation_history(session_id, site_id)
+    )
+    
+    # AI Response logic with improved error handling and platform optimization
+    ai_response = ""
+    model_used = "demo"
+    usage = {}
+    
+    try:
+        if groq_client:
+            # Create conversation context with memory and platform awareness
+            system_prompt = create_system_prompt_with_memory_and_platform(site_config, visitor_context, platform, voice_mode)
+            conversation_context = [
+                {
+                    "role": "system",
+                    "content": SYSTEM_PREFIX
+                },
+                {
+                    "role": "system",
+                    "content": system_prompt
+                }
+            ]
+            
+            # Only opening messages are cacheable; later turns depend on the conversation so far
+            recent_history = trim_history_to_budget(conversation_history)
+            semantic_cache_key = None
+            message_embedding = None
+            if semantic_cache.enabled and not recent_history:
+                semantic_cache_key = (site_id, hashlib.blake2b(system_prompt.encode(), digest_size=16).hexdigest())
+            
+            # Add as much recent conversation history as fits the token budget
+            for msg in recent_history:
                 conversation_context.append({
                     "role": "user",
-                    "content": enhanced_message
+                    "content": msg["user_message"]
                 })
+                conversation_context.append({
+                    "role": "assistant",
+                    "content": msg["ai_response"]
+                })
+            
+            # Add current message with enhanced context including site intelligence
+            enhanced_message = enhance_ai_context_with_memory_and_intelligence(
+                message, site_config, visitor_context, site_intelligence
+            )
+            conversation_context.append({
+                "role": "user",
+                "content": enhanced_message
+            })
+            
+            # Get custom API key for site or use default
+            api_key = site_config.get("groq_api_key") or os.getenv("GROQ_API_KEY")
+            
+            # Platform-specific response parameters
+            max_tokens = 200 if platform in ['ios', 'android'] else 300
+            temperature = 0.7 if voice_mode == 'speech-only' else 0.8
+            
+            prompt_key = None
+            if temperature == 0 or PROMPT_CACHE_SAMPLED_REPLIES:
+                prompt_key = hashlib.sha256(orjson.dumps({
+                    "model": "llama3-8b-8192",
+                    "messages": conversation_context,
+                    "max_tokens": max_tokens,
+                    "temperature": temperature,
+                    "groq_api_key": site_config.get("groq_api_key")
+                }, option=orjson.OPT_SORT_KEYS)).hexdigest()
+            
+            ai_response = prompt_cache.get(prompt_key, "") if prompt_key else ""
+            if ai_response:
+                model_used = "prompt_cache"
+            elif semantic_cache_key:
+                message_embedding = await semantic_cache.embed(message)
+                if message_embedding is not None:
+                    ai_response = semantic_cache.lookup(semantic_cache_key, message_embedding) or ""
+                    if ai_response:
+                        model_used = "semantic_cache"
+            
+            if ai_response:
+                logger.info("Serving cached reply (%s) for session %s", model_used, session_id)
+            elif api_key:
+                # Create client with custom API key if provided
+                client = get_groq_client(api_key) if site_config.get("groq_api_key") else groq_client
                 
-                # Get custom API key for site or use default
-                api_key = site_config.get("groq_api_key") or os.getenv("GROQ_API_KEY")
-                if api_key:
-                    # Create client with custom API key if provided
-                    client = Groq(api_key=api_key) if site_config.get("groq_api_key") else groq_client
-                    
-                    # Platform-specific response parameters
-                    max_tokens = 200 if platform in ['ios', 'android'] else 300
-                    temperature = 0.7 if voice_mode == 'speech-only' else 0.8
-                    
+                try:
+                    await asyncio.wait_for(groq_semaphore.acquire(), timeout=GROQ_ACQUIRE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    raise HTTPException(status_code=429, detail="Server busy, please try again shortly")
+                
+                try:
                     # Get response from GROQ with enhanced parameters
-                    completion = client.chat.completions.create(
+                    completion = await client.chat.completions.create(
                         model="llama3-8b-8192",
                         messages=conversation_context,
                         max_tokens=max_tokens,
                         temperature=temperature,
-                        stream=False
+                        stream=stream_queue is not None
                     )
-                    
-                    ai_response = completion.choices[0].message.content
-                    model_used = "llama3-8b-8192"
-                    
-                    # Content filtering for AI response with platform-specific length limits
-                    ai_response = filter_ai_response(ai_response, platform, voice_mode)
-                    
-                else:
-                    raise Exception("No GROQ API key available")
+                    if stream_queue is None:
+                        ai_response = completion.choices[0].message.content
+                        usage = completion_usage(completion)
+                    else:
+                        ai_response, usage = await relay_completion_stream(completion, stream_queue)
+                finally:
+                    groq_semaphore.release()
                 
-        except Exception as e:
-            logger.error(f"GROQ API error: {e}")
-            # Fallback to demo response with context and platform awareness
-            conversation_history = await get_conversation_history(session_id, site_id)
-            ai_response = generate_contextual_demo_response_with_memory_and_platform(
-                message, conversation_history, visitor_context, platform, voice_mode
-            )
-            model_used = "demo_fallback"
-        
-        # Store conversation in MongoDB with visitor ID and platform info
-        if db is not None:
-            try:
-                conversation_log = {
-                    "session_id": session_id,
-                    "site_id": site_id,
-                    "visitor_id": visitor_id,
-                    "user_message": message,
-                    "ai_response": ai_response,
-                    "timestamp": datetime.utcnow(),
-                    "model": model_used,
-                    "platform": platform,
-                    "voice_mode": voice_mode,
-                    "tokens_used": len(message.split()) + len(ai_response.split()),
-                    "client_ip": client_ip,
-                    "user_agent": request.headers.get("user-agent", "unknown"),
-                    "expires_at": datetime.utcnow() + timedelta(days=90)  # Auto-expire after 90 days
-                }
-                db.conversations.insert_one(conversation_log)
+                model_used = "llama3-8b-8192"
                 
-                # Create index for automatic cleanup
-                db.conversations.create_index("expires_at", expireAfterSeconds=0)
+                # Content filtering for AI response with platform-specific length limits
+                ai_response = filter_ai_response(ai_response, platform, voice_mode)
                 
-                logger.info(f"Conversation logged for visitor {visitor_id}, session {session_id}, platform {platform}")
-            except Exception as e:
-                logger.error(f"Failed to log conversation: {e}")
-        
-        # Get conversation history length
-        conversation_history = await get_conversation_history(session_id, site_id)
-        
-        return {
-            "response": ai_response,
-            "session_id": session_id,
-            "visitor_id": visitor_id,
-            "timestamp": datetime.utcnow().isoformat(),
-            "model": model_used,
-            "platform": platform,
-            "voice_mode": voice_mode,
-            "conversation_length": len(conversation_history) + 1,
-            "is_returning_visitor": visitor_context is not None and len(visitor_context.get("previous_conversations", [])) > 0,
-            "rate_limit_remaining": rate_limit - len(rate_limits[client_ip]["chat"])
-        }
-        
+                if prompt_key:
+                    prompt_cache[prompt_key] = ai_response
+                if message_embedding is not None:
+                    semantic_cache.store(semantic_cache_key, message, message_embedding, ai_response)
+                
+            else:
+                raise Exception("No GROQ API key available")
+            
     except HTTPException:
-        # Re-raise HTTP exceptions (like 400 for missing message)
         raise
     except Exception as e:
-        logger.error(f"Chat endpoint error: {e}")
-        raise HTTPException(status_code=500, detail="Internal server error")
+        logger.error("GROQ API error: %s", e)
+        # Fallback to demo response with context and platform awareness
+        ai_response = generate_contextual_demo_response_with_memory_and_platform(
+            message, conversation_history, visitor_context, platform, voice_mode
+        )
+        model_used = "demo_fallback"
+    
+    # Store conversation in MongoDB with visitor ID and platform info
+    if conversation_writer is not None:
+        try:
+            conversation_log = {
+                "session_id": session_id,
+                "site_id": site_id,
+                "visitor_id": visitor_id,
+                "user_message": message,
+                "ai_response": ai_response,
+                "timestamp": datetime.utcnow(),
+                "model": model_used,
+                "platform": platform,
+                "voice_mode": voice_mode,
+                # Cached and demo replies have no GROQ usage, so fall back to an estimate
+                "tokens_used": usage.get("total_tokens") or (len(message) + len(ai_response)) // CHARS_PER_TOKEN,
+                "prompt_tokens": usage.get("prompt_tokens"),
+                "completion_tokens": usage.get("completion_tokens"),
+                "cached_tokens": usage.get("cached_tokens"),
+                "cache_hit_rate": prompt_cache_hit_rate(usage),
+                "client_ip": client_ip,
+                "user_agent": request.headers.get("user-agent", "unknown"),
+                "expires_at": datetime.utcnow() + timedelta(days=90)  # Auto-expire after 90 days
+            }
+            conversation_writer.put(conversation_log)
+            
+            logger.info("Conversation logged for visitor %s, session %s, platform %s", visitor_id, session_id, platform)
+        except Exception as e:
+            logger.error("Failed to log conversation: %s", e)
+    
+    return {
+        "response": ai_response,
+        "session_id": session_id,
+        "visitor_id": visitor_id,
+        "timestamp": datetime.utcnow().isoformat(),
+        "model": model_used,
+        "platform": platform,
+        "voice_mode": voice_mode,
+        "conversation_length": len(conversation_history) + 1,
+        "is_returning_visitor": visitor_context is not None and len(visitor_context.get("previous_conversations", [])) > 0,
+        "rate_limit_remaining": remaining_requests(client_ip, "chat", rate_limit)
+    }
 
 # ============================================================================
 # DASHBOARD API ENDPOINTS
@@ -613,18 +1216,18 @@ async def register_user(user_data: UserCreate):
         if not user:
             raise HTTPException(status_code=500, detail="Failed to create user")
         
-        return UserResponse(
+        return ORJSONResponse(UserResponse(
             id=user.id,
             email=user.email,
             full_name=user.full_name,
             created_at=user.created_at,
             updated_at=user.updated_at,
             is_active=user.is_active
-        )
+        ).model_dump())
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Registration error: {e}")
+        logger.error("Registration error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/auth/login", response_model=Token)
@@ -642,11 +1245,11 @@ async def login_user(login_data: LoginRequest):
             )
         
         access_token = create_access_token(data={"sub": user.email})
-        return Token(access_token=access_token, token_type="bearer")
+        return ORJSONResponse(Token(access_token=access_token, token_type="bearer").model_dump())
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Login error: {e}")
+        logger.error("Login error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/auth/forgot-password")
@@ -665,11 +1268,11 @@ async def forgot_password(request: PasswordResetRequest):
         if reset_token:
             # TODO: Send email with reset token
             # For now, just log it (in production, send actual email)
-            logger.info(f"Password reset token for {request.email}: {reset_token}")
+            logger.info("Password reset token for %s: %s", request.email, reset_token)
         
         return {"message": "If the email exists, a reset link has been sent"}
     except Exception as e:
-        logger.error(f"Password reset error: {e}")
+        logger.error("Password reset error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/auth/reset-password")
@@ -690,22 +1293,29 @@ async def reset_password(reset_data: PasswordReset):
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Password reset error: {e}")
+        logger.error("Password reset error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/auth/me", response_model=UserResponse)
 async def get_current_user_info(current_user: UserDB = Depends(get_current_user)):
     """Get current user information."""
-    return UserResponse(
+    return ORJSONResponse(UserResponse(
         id=current_user.id,
         email=current_user.email,
         full_name=current_user.full_name,
         created_at=current_user.created_at,
         updated_at=current_user.updated_at,
         is_active=current_user.is_active
-    )
+    ).model_dump())
 
 # Site Management Endpoints
+# These endpoints return responses themselves: response_model stays for the
+# OpenAPI schema, but FastAPI skips re-validating and re-encoding the result.
+# Site bodies are serialized straight to JSON bytes by pydantic-core.
+def site_to_response(site: SiteDB) -> SiteResponse:
+    """Build a site response from a SiteDB without validating its fields a second time"""
+    return SiteResponse.model_construct(**{**dict(site), "theme": SiteTheme.model_construct(**site.theme)})
+
 @app.post("/api/sites", response_model=SiteResponse)
 async def create_site(site_data: SiteCreate, current_user: UserDB = Depends(get_current_user)):
     """Create a new site."""
@@ -717,39 +1327,38 @@ async def create_site(site_data: SiteCreate, current_user: UserDB = Depends(get_
         if not validate_site_domain(site_data.domain):
             raise HTTPException(status_code=400, detail="Invalid domain format")
         
-        # Check if domain already exists
-        existing_site = await db_service.get_site_by_domain(site_data.domain)
-        if existing_site:
+        # The unique domain index rejects a domain that already exists
+        try:
+            site = await db_service.create_site(current_user.id, site_data.dict())
+        except DuplicateKeyError:
             raise HTTPException(status_code=400, detail="Domain already exists")
-        
-        site = await db_service.create_site(current_user.id, site_data.dict())
         if not site:
             raise HTTPException(status_code=500, detail="Failed to create site")
         
-        return SiteResponse(
-            id=site.id,
-            user_id=site.user_id,
-            name=site.name,
-            domain=site.domain,
-            description=site.description,
-            greeting_message=site.greeting_message,
-            bot_name=site.bot_name,
-            theme=SiteTheme(**site.theme),
-            position=site.position,
-            auto_greet=site.auto_greet,
-            voice_enabled=site.voice_enabled,
-            language=site.language,
-            groq_api_key=site.groq_api_key,
-            is_active=site.is_active,
-            created_at=site.created_at,
-            updated_at=site.updated_at
-        )
+        return Response(content=site_to_response(site).model_dump_json(), media_type="application/json")
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Site creation error: {e}")
+        logger.error("Site creation error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
+async def stream_site_list(first_site: Optional[SiteDB], sites: AsyncIterator[SiteDB]):
+    """Emit a user's sites as a JSON array while the cursor is still being read"""
+    if first_site is None:
+        yield b"[]"
+        return
+    
+    yield b"[" + site_to_response(first_site).model_dump_json().encode()
+    try:
+        async for site in sites:
+            yield b"," + site_to_response(site).model_dump_json().encode()
+    except Exception as e:
+        # The status is already sent; aborting leaves the client an unterminated
+        # array rather than a short one that parses
+        logger.error("Get sites stream error: %s", e)
+        raise
+    yield b"]"
+
 @app.get("/api/sites", response_model=List[SiteResponse])
 async def get_user_sites(current_user: UserDB = Depends(get_current_user)):
     """Get all sites for the current user."""
@@ -757,30 +1366,15 @@ async def get_user_sites(current_user: UserDB = Depends(get_current_user)):
         raise HTTPException(status_code=500, detail="Database not available")
     
     try:
-        sites = await db_service.get_user_sites(current_user.id)
-        return [
-            SiteResponse(
-                id=site.id,
-                user_id=site.user_id,
-                name=site.name,
-                domain=site.domain,
-                description=site.description,
-                greeting_message=site.greeting_message,
-                bot_name=site.bot_name,
-                theme=SiteTheme(**site.theme),
-                position=site.position,
-                auto_greet=site.auto_greet,
-                voice_enabled=site.voice_enabled,
-                language=site.language,
-                groq_api_key=site.groq_api_key,
-                is_active=site.is_active,
-                created_at=site.created_at,
-                updated_at=site.updated_at
-            )
-            for site in sites
-        ]
+        # Read the first batch before responding, so a failing query is still a 500
+        sites = db_service.iter_user_sites(current_user.id)
+        try:
+            first_site = await sites.__anext__()
+        except StopAsyncIteration:
+            first_site = None
+        return StreamingResponse(stream_site_list(first_site, sites), media_type="application/json")
     except Exception as e:
-        logger.error(f"Get sites error: {e}")
+        logger.error("Get sites error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/sites/{site_id}", response_model=SiteResponse)
@@ -794,28 +1388,11 @@ async def get_site(site_id: str, current_user: UserDB = Depends(get_current_user
         if not site:
             raise HTTPException(status_code=404, detail="Site not found")
         
-        return SiteResponse(
-            id=site.id,
-            user_id=site.user_id,
-            name=site.name,
-            domain=site.domain,
-            description=site.description,
-            greeting_message=site.greeting_message,
-            bot_name=site.bot_name,
-            theme=SiteTheme(**site.theme),
-            position=site.position,
-            auto_greet=site.auto_greet,
-            voice_enabled=site.voice_enabled,
-            language=site.language,
-            groq_api_key=site.groq_api_key,
-            is_active=site.is_active,
-            created_at=site.created_at,
-            updated_at=site.updated_at
-        )
+        return Response(content=site_to_response(site).model_dump_json(), media_type="application/json")
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Get site error: {e}")
+        logger.error("Get site error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.put("/api/sites/{site_id}", response_model=SiteResponse)
@@ -834,45 +1411,21 @@ async def update_site(site_id: str, site_data: SiteUpdate, current_user: UserDB
         if site_data.domain and not validate_site_domain(site_data.domain):
             raise HTTPException(status_code=400, detail="Invalid domain format")
         
-        # Check if domain already exists (if changing domain)
-        if site_data.domain and site_data.domain != site.domain:
-            existing_site = await db_service.get_site_by_domain(site_data.domain)
-            if existing_site:
-                raise HTTPException(status_code=400, detail="Domain already exists")
+        # Update site; the unique domain index rejects a domain another site already uses
+        update_data = site_data.model_dump(exclude_unset=True, exclude_none=True)
         
-        # Update site
-        update_data = {k: v for k, v in site_data.dict().items() if v is not None}
-        if update_data.get("theme"):
-            update_data["theme"] = update_data["theme"].dict()
-        
-        success = await db_service.update_site(site_id, current_user.id, update_data)
-        if not success:
+        try:
+            updated_site = await db_service.update_site(site_id, current_user.id, update_data)
+        except DuplicateKeyError:
+            raise HTTPException(status_code=400, detail="Domain already exists")
+        if not updated_site:
             raise HTTPException(status_code=500, detail="Failed to update site")
         
-        # Return updated site
-        updated_site = await db_service.get_site_by_id(site_id, current_user.id)
-        return SiteResponse(
-            id=updated_site.id,
-            user_id=updated_site.user_id,
-            name=updated_site.name,
-            domain=updated_site.domain,
-            description=updated_site.description,
-            greeting_message=updated_site.greeting_message,
-            bot_name=updated_site.bot_name,
-            theme=SiteTheme(**updated_site.theme),
-            position=updated_site.position,
-            auto_greet=updated_site.auto_greet,
-            voice_enabled=updated_site.voice_enabled,
-            language=updated_site.language,
-            groq_api_key=updated_site.groq_api_key,
-            is_active=updated_site.is_active,
-            created_at=updated_site.created_at,
-            updated_at=updated_site.updated_at
-        )
+        return Response(content=site_to_response(updated_site).model_dump_json(), media_type="application/json")
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Update site error: {e}")
+        logger.error("Update site error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.delete("/api/sites/{site_id}")
@@ -890,7 +1443,7 @@ async def delete_site(site_id: str, current_user: UserDB = Depends(get_current_u
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Delete site error: {e}")
+        logger.error("Delete site error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 # Analytics Endpoints
@@ -902,9 +1455,9 @@ async def get_dashboard_analytics(current_user: UserDB = Depends(get_current_use
     
     try:
         stats = await db_service.get_dashboard_stats(current_user.id)
-        return stats
+        return ORJSONResponse(stats.model_dump())
     except Exception as e:
-        logger.error(f"Dashboard analytics error: {e}")
+        logger.error("Dashboard analytics error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/analytics/sites/{site_id}", response_model=AnalyticsStats)
@@ -914,22 +1467,43 @@ async def get_site_analytics(site_id: str, days: int = 30, current_user: UserDB
         raise HTTPException(status_code=500, detail="Database not available")
     
     try:
-        # Verify site ownership
+        # Verify site ownership before running the aggregation; the lookup is usually
+        # a site cache hit
         site = await db_service.get_site_by_id(site_id, current_user.id)
         if not site:
             raise HTTPException(status_code=404, detail="Site not found")
         
         stats = await db_service.get_site_analytics(site_id, days)
-        return stats
+        return ORJSONResponse(stats.model_dump())
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Site analytics error: {e}")
+        logger.error("Site analytics error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 # Widget Configuration Endpoints
+EMBED_CACHE_CONTROL = "private, max-age=3600"
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header, which may list several tags, against an ETag"""
+    if not if_none_match:
+        return False
+    # If-None-Match uses weak comparison, so a W/ prefix added by a proxy still matches
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in candidates or etag.removeprefix("W/") in candidates
+
+@lru_cache(maxsize=4096)
+def render_embed_payload(site_id: str, backend_url: str) -> Tuple[str, bytes]:
+    """Serialize a site's embed script response once, with an ETag over its content"""
+    body = orjson.dumps(EmbedScript(
+        site_id=site_id,
+        script_content=generate_embed_script(site_id, backend_url),
+        installation_instructions=get_installation_instructions(site_id)
+    ).model_dump())
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"', body
+
 @app.get("/api/sites/{site_id}/embed", response_model=EmbedScript)
-async def get_embed_script(site_id: str, current_user: UserDB = Depends(get_current_user)):
+async def get_embed_script(site_id: str, request: Request, current_user: UserDB = Depends(get_current_user)):
     """Get embed script for a site."""
     if not db_service:
         raise HTTPException(status_code=500, detail="Database not available")
@@ -941,86 +1515,118 @@ async def get_embed_script(site_id: str, current_user: UserDB = Depends(get_curr
             raise HTTPException(status_code=404, detail="Site not found")
         
         backend_url = os.getenv("BACKEND_URL", "https://your-domain.com")
-        script_content = generate_embed_script(site_id, backend_url)
-        installation_instructions = get_installation_instructions(site_id)
+        etag, body = render_embed_payload(site_id, backend_url)
+        headers = {"ETag": etag, "Cache-Control": EMBED_CACHE_CONTROL}
         
-        return EmbedScript(
-            site_id=site_id,
-            script_content=script_content,
-            installation_instructions=installation_instructions
-        )
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Embed script error: {e}")
+        logger.error("Embed script error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 # Widget endpoint (for embedded widgets)
+WIDGET_HTML_PATH = "/app/backend/static/widget.html"
+WIDGET_CACHE_CONTROL = "public, max-age=60"
+
+# Fallback page scaffolding, built once; only the site id is spliced in per request
+WIDGET_FALLBACK_HEAD = b"""<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>AI Voice Assistant Widget</title>
+</head>
+<body>
+    <div style="padding: 20px; text-align: center; font-family: system-ui;">
+        <h3>AI Voice Assistant</h3>
+        <p>Loading...</p>
+        <script>
+            const siteId = """
+WIDGET_FALLBACK_TAIL = b""";
+            const backendUrl = window.location.origin;
+            
+            // Load widget script
+            const script = document.createElement('script');
+            script.src = '/static/widget.js';
+            script.setAttribute('data-site-id', siteId);
+            script.setAttribute('data-backend-url', backendUrl);
+            document.head.appendChild(script);
+        </script>
+    </div>
+</body>
+</html>
+"""
+
+@lru_cache(maxsize=4)
+def load_widget_page(path: str, mtime: float) -> Dict[str, Tuple[str, bytes]]:
+    """Read the widget page once per file version and precompress it, with an ETag per encoding"""
+    with open(path, "rb") as f:
+        html = f.read()
+    
+    bodies = {"identity": html, "gzip": gzip.compress(html, compresslevel=9)}
+    if brotli is not None:
+        bodies["br"] = brotli.compress(html, quality=11)
+    
+    # Each encoding is a different representation, so they can't share a strong ETag
+    digest = hashlib.blake2b(html, digest_size=8).hexdigest()
+    return {
+        encoding: (f'"{digest}"' if encoding == "identity" else f'"{digest}-{encoding}"', body)
+        for encoding, body in bodies.items()
+    }
+
 @app.get("/widget", response_class=HTMLResponse)
-async def widget_page(site_id: str):
+async def widget_page(request: Request, site_id: str):
     """Serve the widget page for embedding."""
     try:
-        # Return the static widget HTML file
-        return FileResponse("/app/backend/static/widget.html")
+        # Serve the static widget HTML file from its precompressed variants
+        variants = load_widget_page(WIDGET_HTML_PATH, os.path.getmtime(WIDGET_HTML_PATH))
+        headers = {"Cache-Control": WIDGET_CACHE_CONTROL, "Vary": "Accept-Encoding"}
+        
+        accept_encoding = request.headers.get("accept-encoding", "")
+        encoding = next((name for name in ("br", "gzip") if name in variants and name in accept_encoding), "identity")
+        etag, body = variants[encoding]
+        headers["ETag"] = etag
+        
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return HTMLResponse(content=body, headers=headers)
     except Exception as e:
-        logger.error(f"Widget page error: {e}")
-        # Fallback HTML
-        html_content = f"""
-        <!DOCTYPE html>
-        <html lang="en">
-        <head>
-            <meta charset="UTF-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <title>AI Voice Assistant Widget</title>
-        </head>
-        <body>
-            <div style="padding: 20px; text-align: center; font-family: system-ui;">
-                <h3>AI Voice Assistant</h3>
-                <p>Loading...</p>
-                <script>
-                    const siteId = "{site_id}";
-                    const backendUrl = window.location.origin;
-                    
-                    // Load widget script
-                    const script = document.createElement('script');
-                    script.src = '/static/widget.js';
-                    script.setAttribute('data-site-id', siteId);
-                    script.setAttribute('data-backend-url', backendUrl);
-                    document.head.appendChild(script);
-                </script>
-            </div>
-        </body>
-        </html>
-        """
-        return HTMLResponse(content=html_content)
+        logger.error("Widget page error: %s", e)
+        # Fallback HTML; the site id is JSON-encoded with "<" escaped so it can't close the script tag
+        site_id_js = orjson.dumps(site_id).replace(b"<", b"\\u003c")
+        return HTMLResponse(content=WIDGET_FALLBACK_HEAD + site_id_js + WIDGET_FALLBACK_TAIL)
 
 # Updated analytics endpoint to work with new database
 @app.post("/api/analytics/interaction")
-async def log_interaction(request: Request):
+async def log_interaction(body: InteractionLogRequest, request: Request):
     """Log widget interaction for analytics."""
     try:
-        body = await request.json()
-        
-        if not db_service:
+        if interaction_writer is None:
             # Just return success if database not available
             return {"status": "logged"}
         
-        interaction_data = {
-            "site_id": body.get("site_id"),
-            "session_id": body.get("session_id"),
-            "interaction_type": body.get("type"),
-            "user_message": body.get("user_message"),
-            "ai_response": body.get("ai_response"),
-            "timestamp": datetime.utcnow(),
-            "user_agent": request.headers.get("user-agent"),
-            "ip_address": request.client.host
-        }
+        interaction = InteractionDB(
+            site_id=body.site_id,
+            session_id=body.session_id,
+            interaction_type=body.type,
+            user_message=body.user_message,
+            ai_response=body.ai_response,
+            user_agent=request.headers.get("user-agent"),
+            ip_address=request.client.host
+        )
         
-        await db_service.create_interaction(interaction_data)
+        # Queued for the batch writer; the response doesn't wait on the insert
+        interaction_writer.put(interaction.dict())
         return {"status": "logged"}
         
     except Exception as e:
-        logger.error(f"Analytics endpoint error: {e}")
+        logger.error("Analytics endpoint error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 # ============================================================================
@@ -1037,11 +1643,11 @@ async def get_visitor_context(visitor_id: str, site_id: str) -> Dict[str, Any]:
         ninety_days_ago = datetime.utcnow() - timedelta(days=90)
         
         # Get conversation summary
-        conversations = list(db.conversations.find({
+        conversations = await db.conversations.find({
             "visitor_id": visitor_id,
             "site_id": site_id,
             "timestamp": {"$gte": ninety_days_ago}
-        }).sort("timestamp", -1).limit(50))  # Last 50 conversations
+        }).sort("timestamp", -1).limit(50).to_list(None)  # Last 50 conversations
         
         if not conversations:
             return None
@@ -1072,30 +1678,29 @@ async def get_visitor_context(visitor_id: str, site_id: str) -> Dict[str, Any]:
         return context
         
     except Exception as e:
-        logger.error(f"Error getting visitor context: {e}")
+        logger.error("Error getting visitor context: %s", e)
         return None
 
+TOPIC_KEYWORDS = KeywordClassifier([
+    ("product", ["product", "service", "offer", "buy", "purchase", "price", "cost"]),
+    ("support", ["help", "problem", "issue", "error", "trouble", "fix", "support"]),
+    ("navigation", ["find", "where", "navigate", "locate", "search", "page"]),
+    ("information", ["about", "info", "details", "explain", "what", "how", "why"]),
+    ("account", ["account", "login", "register", "profile", "settings", "password"]),
+])
+
 def extract_topics_from_messages(messages: List[str]) -> List[str]:
     """Extract key topics from user messages"""
     topics = []
-    keywords = {
-        "product": ["product", "service", "offer", "buy", "purchase", "price", "cost"],
-        "support": ["help", "problem", "issue", "error", "trouble", "fix", "support"],
-        "navigation": ["find", "where", "navigate", "locate", "search", "page"],
-        "information": ["about", "info", "details", "explain", "what", "how", "why"],
-        "account": ["account", "login", "register", "profile", "settings", "password"]
-    }
-    
     for message in messages:
-        message_lower = message.lower()
-        for topic, words in keywords.items():
-            if any(word in message_lower for word in words):
-                if topic not in topics:
-                    topics.append(topic)
+        # One pass per message finds every topic it mentions
+        for topic in TOPIC_KEYWORDS.all_matches(message.lower()):
+            if topic not in topics:
+                topics.append(topic)
     
     return topics
 
-async def enhance_ai_context_with_memory(message: str, site_config: Dict[str, Any], visitor_context: Dict[str, Any]) -> str:
+def enhance_ai_context_with_memory(message: str, site_config: Dict[str, Any], visitor_context: Dict[str, Any]) -> str:
     """Enhanced AI context with website-specific information and visitor memory"""
     context_parts = [f"User Question: {message}"]
     
@@ -1128,7 +1733,7 @@ Visitor Memory (Last 90 Days):
     
     return "\n".join(context_parts)
 
-async def enhance_ai_context_with_memory_and_intelligence(
+def enhance_ai_context_with_memory_and_intelligence(
     message: str, 
     site_config: Dict[str, Any], 
     visitor_context: Dict[str, Any],
@@ -1202,80 +1807,35 @@ Intelligent Assistance Instructions:
     
     return "\n".join(context_parts)
 
-def create_system_prompt_with_memory_and_platform(site_config: Dict[str, Any], visitor_context: Dict[str, Any], platform: str, voice_mode: str) -> str:
-    """Create customized system prompt with visitor memory, website intelligence, and platform awareness"""
-    bot_name = site_config.get("bot_name", "AI Assistant")
-    language = site_config.get("language", "en-US")
-    
-    # Platform-specific response guidelines
-    platform_guidelines = {
-        "ios": {
-            "response_length": "Keep responses under 150 words for optimal voice synthesis on iOS",
-            "voice_note": "iOS voice features may be limited, prioritize clear, concise responses",
-            "interaction": "Users tap to interact, responses should be immediate and clear"
-        },
-        "android": {
-            "response_length": "Keep responses under 200 words for good mobile experience",
-            "voice_note": "Android supports full voice features, balance text and voice responses",
-            "interaction": "Users can both tap and hold for voice, provide flexible interaction hints"
-        },
-        "desktop": {
-            "response_length": "Responses can be up to 300 words for comprehensive answers",
-            "voice_note": "Full voice features available, use rich responses with voice output",
-            "interaction": "Users have full keyboard and mouse, provide detailed guidance"
-        }
-    }
-    
-    current_platform = platform_guidelines.get(platform, platform_guidelines["desktop"])
-    
-    # Voice mode specific instructions
-    voice_instructions = {
-        "full": "You can both listen and speak. Use voice-friendly language and provide audio responses.",
-        "speech-only": "You can speak but voice recognition is limited. Focus on clear audio responses.",
-        "text-only": "Voice features are disabled. Focus on text-based interaction."
+# Platform-specific response guidelines
+PLATFORM_GUIDELINES = {
+    "ios": {
+        "response_length": "Keep responses under 150 words for optimal voice synthesis on iOS",
+        "voice_note": "iOS voice features may be limited, prioritize clear, concise responses",
+        "interaction": "Users tap to interact, responses should be immediate and clear"
+    },
+    "android": {
+        "response_length": "Keep responses under 200 words for good mobile experience",
+        "voice_note": "Android supports full voice features, balance text and voice responses",
+        "interaction": "Users can both tap and hold for voice, provide flexible interaction hints"
+    },
+    "desktop": {
+        "response_length": "Responses can be up to 300 words for comprehensive answers",
+        "voice_note": "Full voice features available, use rich responses with voice output",
+        "interaction": "Users have full keyboard and mouse, provide detailed guidance"
     }
-    
-    # Base prompt with enhanced capabilities
-    base_prompt = f"""You are {bot_name}, an intelligent AI assistant embedded on a website to help visitors with all their questions and needs. You are equipped with comprehensive website knowledge and can provide intelligent navigation assistance.
+}
 
-**PLATFORM CONTEXT:**
-- Platform: {platform.upper()}
-- Voice Mode: {voice_mode.upper()}
-- {current_platform['response_length']}
-- {current_platform['voice_note']}
-- {current_platform['interaction']}
-- Voice Instructions: {voice_instructions.get(voice_mode, voice_instructions['full'])}"""
-    
-    # Add personalization based on visitor context
-    if visitor_context and visitor_context.get('is_returning_visitor'):
-        total_conversations = visitor_context.get('total_conversations', 0)
-        days_since_first = visitor_context.get('days_since_first_visit', 0)
-        days_since_last = visitor_context.get('days_since_last_visit', 0)
-        recent_topics = visitor_context.get('recent_topics', [])
-        
-        personalization = f"""
-**VISITOR CONTEXT:**
-- This is a returning visitor who has had {total_conversations} conversations with you
-- First visited {days_since_first} days ago
-- Last visited {days_since_last} days ago
-- Previous interests: {', '.join(recent_topics) if recent_topics else 'General inquiries'}
-- Be welcoming and acknowledge their return while being helpful
-
-**PERSONALIZATION GUIDELINES:**
-- Reference their previous interests when relevant
-- Show appreciation for their return
-- Build on previous conversations when appropriate
-- Provide continuity in your assistance"""
-    else:
-        personalization = """
-**VISITOR CONTEXT:**
-- This appears to be a new visitor
-- Provide a warm welcome and comprehensive introduction
-- Be extra helpful in explaining website features and capabilities"""
-    
-    full_prompt = f"""{base_prompt}
+# Voice mode specific instructions
+VOICE_INSTRUCTIONS = {
+    "full": "You can both listen and speak. Use voice-friendly language and provide audio responses.",
+    "speech-only": "You can speak but voice recognition is limited. Focus on clear audio responses.",
+    "text-only": "Voice features are disabled. Focus on text-based interaction."
+}
 
-{personalization}
+# Identical for every site and visitor so GROQ's prefix cache can reuse it across
+# requests; anything that varies belongs in the second system message
+SYSTEM_PREFIX = """You are an intelligent AI assistant embedded on a website to help visitors with all their questions and needs. You are equipped with comprehensive website knowledge and can provide intelligent navigation assistance.
 
 **CORE CAPABILITIES:**
 - Answer questions about the website, its content, services, and features
@@ -1295,9 +1855,8 @@ def create_system_prompt_with_memory_and_platform(site_config: Dict[str, Any], v
 - You can provide step-by-step navigation instructions
 - You can suggest related content and help users discover relevant information
 
-**PLATFORM-SPECIFIC CONVERSATION STYLE:**
+**CONVERSATION STYLE:**
 - Be friendly, professional, and conversational
-- {current_platform['response_length']}
 - Remember conversation history and maintain context
 - Ask clarifying questions when needed to better understand user intent
 - Provide specific, actionable information and navigation guidance
@@ -1312,28 +1871,111 @@ def create_system_prompt_with_memory_and_platform(site_config: Dict[str, Any], v
 5. Anticipate follow-up questions and provide comprehensive help
 6. Use their history to personalize recommendations
 
-**LANGUAGE:** {language}
-
 Remember: You are not just answering questions, you are actively helping visitors navigate and get the most value from their website experience. Use your website intelligence to provide smart, contextual assistance that guides them to success!"""
+
+# Keyed on the values rendered into the prompt, so a site config change simply
+# produces a new cache key instead of needing explicit invalidation
+@lru_cache(maxsize=1024)
+def render_platform_prompt(bot_name: str, language: str, platform: str, voice_mode: str) -> str:
+    """Render the site and platform specific part of the system prompt"""
+    current_platform = PLATFORM_GUIDELINES.get(platform, PLATFORM_GUIDELINES["desktop"])
     
-    return full_prompt
+    return f"""**ASSISTANT NAME:** {bot_name}
 
-def filter_ai_response(response: str, platform: str = "desktop", voice_mode: str = "full") -> str:
-    """Filter AI responses for inappropriate content while preserving helpful information with platform optimization"""
-    if not response:
-        return "I apologize, but I couldn't generate a proper response. Please try again."
+**PLATFORM CONTEXT:**
+- Platform: {platform.upper()}
+- Voice Mode: {voice_mode.upper()}
+- {current_platform['response_length']}
+- {current_platform['voice_note']}
+- {current_platform['interaction']}
+- Voice Instructions: {VOICE_INSTRUCTIONS.get(voice_mode, VOICE_INSTRUCTIONS['full'])}
+
+**LANGUAGE:** {language}"""
+
+NEW_VISITOR_PERSONALIZATION = """
+**VISITOR CONTEXT:**
+- This appears to be a new visitor
+- Provide a warm welcome and comprehensive introduction
+- Be extra helpful in explaining website features and capabilities"""
+
+def create_system_prompt_with_memory_and_platform(site_config: Dict[str, Any], visitor_context: Dict[str, Any], platform: str, voice_mode: str) -> str:
+    """Create the variable system prompt that follows SYSTEM_PREFIX, with visitor memory and platform awareness"""
+    platform_prompt = render_platform_prompt(
+        site_config.get("bot_name", "AI Assistant"),
+        site_config.get("language", "en-US"),
+        platform,
+        voice_mode
+    )
+    
+    # Add personalization based on visitor context
+    if visitor_context and visitor_context.get('is_returning_visitor'):
+        total_conversations = visitor_context.get('total_conversations', 0)
+        days_since_first = visitor_context.get('days_since_first_visit', 0)
+        days_since_last = visitor_context.get('days_since_last_visit', 0)
+        recent_topics = visitor_context.get('recent_topics', [])
+        
+        personalization = f"""
+**VISITOR CONTEXT:**
+- This is a returning visitor who has had {total_conversations} conversations with you
+- First visited {days_since_first} days ago
+- Last visited {days_since_last} days ago
+- Previous interests: {', '.join(recent_topics) if recent_topics else 'General inquiries'}
+- Be welcoming and acknowledge their return while being helpful
+
+**PERSONALIZATION GUIDELINES:**
+- Reference their previous interests when relevant
+- Show appreciation for their return
+- Build on previous conversations when appropriate
+- Provide continuity in your assistance"""
+    else:
+        personalization = NEW_VISITOR_PERSONALIZATION
     
+    return f"{platform_prompt}\n\n{personalization}"
+
+def scrub_ai_text(text: str) -> str:
+    """Strip blocked patterns and mask profanity in AI text"""
     # Remove any potential script injection
-    for pattern in BLOCKED_PATTERNS:
-        response = re.sub(pattern, '', response, flags=re.IGNORECASE)
+    if has_blocked_content(text):
+        text = strip_blocked_patterns(text)
     
     # Basic profanity filter (minimal to preserve natural conversation)
-    profanity_words = [
-        'fuck', 'shit', 'bitch', 'ass', 'damn'
-    ]
+    return PROFANITY_MASKER.sub(text)
+
+# Apart from a script element, no blocked pattern or profane word spans punctuation
+# followed by whitespace, so streamed text can be scrubbed a clause at a time
+STREAM_BREAK_PATTERN = re.compile(r'[.!?,;:]\s+')
+SCRIPT_OPEN_PATTERN = re.compile(r'<script', re.IGNORECASE)
+SCRIPT_ELEMENT_PATTERN = re.compile(r'<script[^>]*>.*?</script>', re.IGNORECASE | re.DOTALL)
+
+def find_script_elements(text: str) -> Tuple[List[Tuple[int, int]], int]:
+    """Spans of complete script elements, and where the first unclosed <script starts"""
+    elements = []
+    position = 0
+    while (opening := SCRIPT_OPEN_PATTERN.search(text, position)):
+        element = SCRIPT_ELEMENT_PATTERN.match(text, opening.start())
+        if element is None:
+            return elements, opening.start()
+        elements.append(element.span())
+        position = element.end()
+    return elements, len(text)
+
+def stream_safe_length(text: str) -> int:
+    """Length of the leading part of streamed text that can be scrubbed on its own"""
+    # Breaks inside a script element don't count, and nothing from an unclosed
+    # <script onwards is released until it closes
+    elements, limit = find_script_elements(text)
+    safe = 0
+    for match in STREAM_BREAK_PATTERN.finditer(text, 0, limit):
+        if not any(start <= match.start() < end for start, end in elements):
+            safe = match.end()
+    return safe
+
+def filter_ai_response(response: str, platform: str = "desktop", voice_mode: str = "full") -> str:
+    """Filter AI responses for inappropriate content while preserving helpful information with platform optimization"""
+    if not response:
+        return "I apologize, but I couldn't generate a proper response. Please try again."
     
-    for word in profanity_words:
-        response = re.sub(r'\b' + re.escape(word) + r'\b', '[filtered]', response, flags=re.IGNORECASE)
+    response = scrub_ai_text(response)
     
     # Platform-specific length limits
     if platform == "ios":
@@ -1348,6 +1990,8 @@ def filter_ai_response(response: str, platform: str = "desktop", voice_mode: str
     
     return response.strip()
 
+GREETING_KEYWORDS = ('hello', 'hi', 'hey', 'good morning', 'good afternoon', 'good evening')
+
 def generate_contextual_demo_response_with_memory_and_platform(
     message: str, 
     conversation_history: List[Dict[str, Any]], 
@@ -1370,7 +2014,7 @@ def generate_contextual_demo_response_with_memory_and_platform(
         max_words = 80 if voice_mode != "text-only" else 100
     
     # Personalized greetings for returning visitors
-    if any(greeting in message_lower for greeting in ['hello', 'hi', 'hey', 'good morning', 'good afternoon', 'good evening']):
+    if any(greeting in message_lower for greeting in GREETING_KEYWORDS):
         if is_returning:
             days_since_last = visitor_context.get('days_since_last_visit', 0)
             total_conversations = visitor_context.get('total_conversations', 0)
@@ -1409,16 +2053,94 @@ def generate_contextual_demo_response_with_memory_and_platform(
     
     return base_response
 
-async def get_conversation_history(session_id: str, site_id: str, limit: int = 10) -> List[Dict[str, Any]]:
-    """Get conversation history for a session"""
+@lru_cache(maxsize=4096)
+def count_tokens(text: str) -> int:
+    """Count tokens in text, falling back to a character-length estimate without tiktoken"""
+    if not text:
+        return 0
+    if token_encoding is None:
+        return len(text) // CHARS_PER_TOKEN
+    return len(token_encoding.encode(text))
+
+def trim_history_to_budget(conversation_history: List[Dict[str, Any]], budget: int = HISTORY_TOKEN_BUDGET) -> List[Dict[str, Any]]:
+    """Keep the most recent conversation turns that fit within the token budget"""
+    kept = []
+    used = 0
+    for msg in reversed(conversation_history):
+        cost = count_tokens(msg["user_message"]) + count_tokens(msg["ai_response"])
+        if used + cost > budget:
+            break
+        used += cost
+        kept.append(msg)
+    kept.reverse()
+    return kept
+
+def completion_usage(report) -> Dict[str, Optional[int]]:
+    """Token usage GROQ reported for a completion, including prefix-cached prompt tokens when available"""
+    usage = getattr(report, "usage", None)
+    if usage is None:
+        return {}
+    details = getattr(usage, "prompt_tokens_details", None)
+    return {
+        "prompt_tokens": usage.prompt_tokens,
+        "completion_tokens": usage.completion_tokens,
+        "total_tokens": usage.total_tokens,
+        "cached_tokens": getattr(details, "cached_tokens", None)
+    }
+
+def prompt_cache_hit_rate(usage: Dict[str, Optional[int]]) -> Optional[float]:
+    """Share of prompt tokens GROQ served from its prefix cache, if the response reports it"""
+    if usage.get("cached_tokens") is None or not usage.get("prompt_tokens"):
+        return None
+    return usage["cached_tokens"] / usage["prompt_tokens"]
+
+async def relay_completion_stream(stream, queue: asyncio.Queue) -> Tuple[str, Dict[str, Optional[int]]]:
+    """Forward scrubbed completion text to the queue, returning the full raw reply and its token usage"""
+    parts = []
+    pending = ""
+    usage = {}
+    async for chunk in stream:
+        delta = chunk.choices[0].delta.content if chunk.choices else None
+        if delta:
+            parts.append(delta)
+            # Text is held back to a clause break so it passes the same filter as /api/chat
+            pending += delta
+            safe = 0
+            # An unclosed <script in the raw text may be closed later and removed whole,
+            # so nothing is released while one is open. Breaks are found after stripping,
+            # since a removed match can take a break with it or rebuild a tag from its pieces
+            if find_script_elements(pending)[1] == len(pending):
+                stripped = strip_blocked_patterns(pending) if has_blocked_content(pending) else pending
+                safe = stream_safe_length(stripped)
+            if safe:
+                released = PROFANITY_MASKER.sub(stripped[:safe])
+                pending = stripped[safe:]
+                if released:
+                    queue.put_nowait(released)
+        # GROQ reports usage on the final chunk under x_groq
+        usage = completion_usage(getattr(chunk, "x_groq", None)) or usage
+    
+    if pending:
+        released = scrub_ai_text(pending)
+        if released:
+            queue.put_nowait(released)
+    return "".join(parts), usage
+
+async def get_conversation_history(session_id: str, site_id: str, limit: int = 10, before_ts: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """Get conversation history for a session, optionally only turns older than before_ts"""
     try:
         if db is None:
             return []
         
-        conversations = list(db.conversations.find({
-            "session_id": session_id,
-            "site_id": site_id
-        }).sort("timestamp", 1).limit(limit))
+        # Pages are keyed on the oldest timestamp already seen rather than skipped
+        # over, so deeper pages stay an index seek
+        query = {"session_id": session_id, "site_id": site_id}
+        if before_ts is not None:
+            query["timestamp"] = {"$lt": before_ts}
+        
+        # Newest turns first so the limit keeps the latest ones, then back to chronological order
+        conversations = await db.conversations.find(query, {"user_message": 1, "ai_response": 1, "timestamp": 1, "_id": 0}).sort("timestamp", -1).limit(limit).to_list(limit)
+        conversations.reverse()
         
         return [
             {
@@ -1429,10 +2151,10 @@ async def get_conversation_history(session_id: str, site_id: str, limit: int = 1
             for conv in conversations
         ]
     except Exception as e:
-        logger.error(f"Error getting conversation history: {e}")
+        logger.error("Error getting conversation history: %s", e)
         return []
 
-async def get_site_configuration(site_id: str) -> Dict[str, Any]:
+async def get_site_configuration(site_id: str) -> Mapping[str, Any]:
     """Get site configuration for AI customization"""
     try:
         if not db_service:
@@ -1443,21 +2165,24 @@ async def get_site_configuration(site_id: str) -> Dict[str, Any]:
             return config
         return get_default_site_config()
     except Exception as e:
-        logger.error(f"Error getting site configuration: {e}")
+        logger.error("Error getting site configuration: %s", e)
         return get_default_site_config()
 
-def get_default_site_config() -> Dict[str, Any]:
+# Shared read-only instance; callers only read from site configs
+DEFAULT_SITE_CONFIG: Mapping[str, Any] = MappingProxyType({
+    "site_id": "demo-site",
+    "greeting_message": "Hi there! I'm your virtual assistant. How can I help you today?",
+    "bot_name": "AI Assistant",
+    "language": "en-US",
+    "voice_enabled": True,
+    "groq_api_key": None
+})
+
+def get_default_site_config() -> Mapping[str, Any]:
     """Get default site configuration"""
-    return {
-        "site_id": "demo-site",
-        "greeting_message": "Hi there! I'm your virtual assistant. How can I help you today?",
-        "bot_name": "AI Assistant",
-        "language": "en-US",
-        "voice_enabled": True,
-        "groq_api_key": None
-    }
+    return DEFAULT_SITE_CONFIG
 
-async def enhance_ai_context(message: str, site_config: Dict[str, Any]) -> str:
+def enhance_ai_context(message: str, site_config: Dict[str, Any]) -> str:
     """Enhance AI context with website-specific information"""
     # Add website context to the message for better AI understanding
     site_context = f"""
@@ -1474,10 +2199,9 @@ Please provide a helpful response considering you are an AI assistant on this we
 
 def create_system_prompt(site_config: Dict[str, Any]) -> str:
     """Create customized system prompt based on site configuration"""
-    bot_name = site_config.get("bot_name", "AI Assistant")
-    language = site_config.get("language", "en-US")
-    
-    base_prompt = f"""You are {bot_name}, an intelligent AI assistant embedded on a website to help visitors with all their questions and needs. You are knowledgeable, helpful, and can assist with:
+    return render_system_prompt(site_config.get("bot_name", "AI Assistant"), site_config.get("language", "en-US"))
+
+SYSTEM_PROMPT_TEMPLATE = string.Template("""You are $bot_name, an intelligent AI assistant embedded on a website to help visitors with all their questions and needs. You are knowledgeable, helpful, and can assist with:
 
 **CORE CAPABILITIES:**
 - Answer questions about the website, its content, services, and features
@@ -1515,34 +2239,47 @@ def create_system_prompt(site_config: Dict[str, Any]) -> str:
 5. Stay engaging and maintain a conversational flow
 6. Be proactive in offering additional help
 
-**LANGUAGE:** {language}
-
-Remember: You are here to make the visitor's experience better and help them accomplish their goals on this website. Be their knowledgeable, friendly guide!"""
-    
-    return base_prompt
-
-def filter_ai_response(response: str) -> str:
-    """Filter AI responses for inappropriate content while preserving helpful information"""
-    if not response:
-        return "I apologize, but I couldn't generate a proper response. Please try again."
-    
-    # Remove any potential script injection
-    for pattern in BLOCKED_PATTERNS:
-        response = re.sub(pattern, '', response, flags=re.IGNORECASE)
-    
-    # Basic profanity filter (minimal to preserve natural conversation)
-    profanity_words = [
-        'fuck', 'shit', 'bitch', 'ass', 'damn'
-    ]
-    
-    for word in profanity_words:
-        response = re.sub(r'\b' + re.escape(word) + r'\b', '[filtered]', response, flags=re.IGNORECASE)
-    
-    # Allow longer responses for detailed explanations (increased limit)
-    if len(response) > 800:
-        response = response[:797] + "..."
-    
-    return response.strip()
+**LANGUAGE:** $language
+
+Remember: You are here to make the visitor's experience better and help them accomplish their goals on this website. Be their knowledgeable, friendly guide!""")
+
+@lru_cache(maxsize=512)
+def render_system_prompt(bot_name: str, language: str) -> str:
+    """Render the basic system prompt once per bot name and language"""
+    return SYSTEM_PROMPT_TEMPLATE.substitute(bot_name=bot_name, language=language)
+
+FOLLOW_UP_KEYWORDS = KeywordClassifier([
+    ("more", ['more', 'tell me more', 'continue', 'elaborate', 'explain further']),
+    ("clarify", ['what do you mean', 'explain', 'clarify', 'how', 'why']),
+])
+
+# Categories are listed in the order they were checked, which decides ties
+CONTEXTUAL_DEMO_KEYWORDS = KeywordClassifier([
+    ("greeting", GREETING_KEYWORDS),
+    ("website", ['website', 'site', 'page', 'navigation', 'menu', 'find']),
+    ("product", ['product', 'service', 'offer', 'price', 'cost', 'buy', 'purchase']),
+    ("support", ['problem', 'issue', 'error', 'not working', 'broken', 'fix', 'trouble']),
+    ("how_to", ['how to', 'how do', 'how can', 'step', 'guide', 'tutorial']),
+    ("contact", ['contact', 'support', 'help', 'customer service', 'phone', 'email']),
+    ("about", ['about', 'company', 'business', 'who', 'what is', 'information']),
+    ("capabilities", ['what can you do', 'help', 'capabilities', 'assist']),
+    ("personal", ['how are you', 'how do you do', 'what are you']),
+    ("thanks", ['thank', 'thanks', 'appreciate']),
+    ("goodbye", ['bye', 'goodbye', 'see you', 'later']),
+])
+
+CONTEXTUAL_DEMO_RESPONSES = {
+    "website": "I can help you navigate this website and find what you're looking for. I can explain features, help you locate specific content, or guide you through any processes. What are you trying to find or accomplish?",
+    "product": "I can help you learn about products and services offered here. I can explain features, compare options, discuss pricing, or guide you through the selection process. What specific information are you looking for?",
+    "support": "I'm here to help resolve any issues you're experiencing. I can provide troubleshooting steps, explain how features work, or guide you to the right resources. What specific problem are you encountering?",
+    "how_to": "I'd be happy to provide step-by-step guidance! I can walk you through processes, explain how to use features, or provide instructions. What would you like to learn how to do?",
+    "contact": "I can help you find contact information and support resources. I can also try to answer your questions directly or guide you to the right person or department. What do you need assistance with?",
+    "about": "I can share information about this website, the company, services, or any other details you're curious about. What specific information would you like to know?",
+    "capabilities": "I can help you with a wide range of things! I can answer questions about this website, explain features, help you navigate, troubleshoot issues, provide information about products or services, and much more. What would you like assistance with?",
+    "personal": "I'm doing great and I'm here to help! I'm an AI assistant designed to make your experience on this website better. I can answer questions, provide guidance, and help you find what you need. How can I assist you today?",
+    "thanks": "You're very welcome! I'm glad I could help. If you have any other questions or need assistance with anything else on this website, feel free to ask anytime!",
+    "goodbye": "Goodbye! It was great helping you today. Feel free to come back anytime if you have more questions or need assistance with anything on this website. Have a wonderful day!",
+}
 
 def generate_contextual_demo_response(message: str, conversation_history: List[Dict[str, Any]]) -> str:
     """Generate demo responses with conversation context and enhanced capabilities"""
@@ -1550,10 +2287,11 @@ def generate_contextual_demo_response(message: str, conversation_history: List[D
     
     # Check if this is a follow-up based on history
     if conversation_history:
-        last_response = conversation_history[-1].get("ai_response", "").lower()
+        follow_up = FOLLOW_UP_KEYWORDS.first_match(message_lower)
         
         # Handle follow-up questions
-        if any(word in message_lower for word in ['more', 'tell me more', 'continue', 'elaborate', 'explain further']):
+        if follow_up == "more":
+            last_response = conversation_history[-1].get("ai_response", "").lower()
             if 'website' in last_response or 'site' in last_response:
                 return "I can help you understand more about this website's features, navigation, content, or any specific functionality you're interested in. What particular aspect would you like to know more about?"
             elif 'product' in last_response or 'service' in last_response:
@@ -1564,57 +2302,18 @@ def generate_contextual_demo_response(message: str, conversation_history: List[D
                 return "I'd be happy to provide more details! Could you be more specific about what aspect you'd like to know more about?"
         
         # Handle clarification requests
-        if any(word in message_lower for word in ['what do you mean', 'explain', 'clarify', 'how', 'why']):
+        if follow_up == "clarify":
             return "Let me clarify that for you. I'm here to help explain anything about this website, its features, or answer any questions you have. What specifically would you like me to explain?"
     
-    # Enhanced responses for various query types
-    
-    # Greetings and basic interactions
-    if any(greeting in message_lower for greeting in ['hello', 'hi', 'hey', 'good morning', 'good afternoon', 'good evening']):
+    # Enhanced responses for various query types, classified in one pass
+    category = CONTEXTUAL_DEMO_KEYWORDS.first_match(message_lower)
+    if category == "greeting":
         if conversation_history:
             return "Hello again! I'm here to help you with anything you need on this website. Do you have any questions about our content, features, or how to find what you're looking for?"
         else:
             return "Hello! I'm your AI assistant, ready to help you navigate this website and answer any questions you have. What can I help you with today?"
-    
-    # Website-specific queries
-    if any(word in message_lower for word in ['website', 'site', 'page', 'navigation', 'menu', 'find']):
-        return "I can help you navigate this website and find what you're looking for. I can explain features, help you locate specific content, or guide you through any processes. What are you trying to find or accomplish?"
-    
-    # Product/Service queries
-    if any(word in message_lower for word in ['product', 'service', 'offer', 'price', 'cost', 'buy', 'purchase']):
-        return "I can help you learn about products and services offered here. I can explain features, compare options, discuss pricing, or guide you through the selection process. What specific information are you looking for?"
-    
-    # Technical support queries
-    if any(word in message_lower for word in ['problem', 'issue', 'error', 'not working', 'broken', 'fix', 'trouble']):
-        return "I'm here to help resolve any issues you're experiencing. I can provide troubleshooting steps, explain how features work, or guide you to the right resources. What specific problem are you encountering?"
-    
-    # How-to queries
-    if any(word in message_lower for word in ['how to', 'how do', 'how can', 'step', 'guide', 'tutorial']):
-        return "I'd be happy to provide step-by-step guidance! I can walk you through processes, explain how to use features, or provide instructions. What would you like to learn how to do?"
-    
-    # Contact and support queries
-    if any(word in message_lower for word in ['contact', 'support', 'help', 'customer service', 'phone', 'email']):
-        return "I can help you find contact information and support resources. I can also try to answer your questions directly or guide you to the right person or department. What do you need assistance with?"
-    
-    # About/Information queries
-    if any(word in message_lower for word in ['about', 'company', 'business', 'who', 'what is', 'information']):
-        return "I can share information about this website, the company, services, or any other details you're curious about. What specific information would you like to know?"
-    
-    # General capabilities
-    if any(word in message_lower for word in ['what can you do', 'help', 'capabilities', 'assist']):
-        return "I can help you with a wide range of things! I can answer questions about this website, explain features, help you navigate, troubleshoot issues, provide information about products or services, and much more. What would you like assistance with?"
-    
-    # Personal questions
-    if any(question in message_lower for question in ['how are you', 'how do you do', 'what are you']):
-        return "I'm doing great and I'm here to help! I'm an AI assistant designed to make your experience on this website better. I can answer questions, provide guidance, and help you find what you need. How can I assist you today?"
-    
-    # Gratitude responses
-    if any(word in message_lower for word in ['thank', 'thanks', 'appreciate']):
-        return "You're very welcome! I'm glad I could help. If you have any other questions or need assistance with anything else on this website, feel free to ask anytime!"
-    
-    # Goodbye responses
-    if any(word in message_lower for word in ['bye', 'goodbye', 'see you', 'later']):
-        return "Goodbye! It was great helping you today. Feel free to come back anytime if you have more questions or need assistance with anything on this website. Have a wonderful day!"
+    if category:
+        return CONTEXTUAL_DEMO_RESPONSES[category]
     
     # Default intelligent response for any other query
     context_info = ""
@@ -1623,83 +2322,95 @@ def generate_contextual_demo_response(message: str, conversation_history: List[D
     
     return f"That's an interesting question about '{message}'. I'm here to help with anything related to this website - whether it's navigation, features, content, or general information. I can provide explanations, guidance, or help you find what you're looking for.{context_info} What specific aspect would you like to know more about?"
 
+DEMO_RESPONSE_KEYWORDS = KeywordClassifier([
+    ("greeting", ['hello', 'hi', 'hey', 'good morning', 'good afternoon']),
+    ("wellbeing", ['how are you', 'how do you do']),
+    ("capabilities", ['help', 'what can you do', 'capabilities']),
+    ("weather", ['weather', 'temperature']),
+    ("time", ['time', 'date']),
+    ("thanks", ['thank', 'thanks']),
+    ("goodbye", ['bye', 'goodbye', 'see you']),
+])
+
+DEMO_RESPONSES = {
+    "greeting": "Hello! I'm your AI voice assistant. How can I help you today?",
+    "wellbeing": "I'm doing great, thank you for asking! I'm here to help answer your questions and assist with anything you need.",
+    "capabilities": "I can help you with questions, provide information, and have conversations. Try asking me about various topics or let me know what you'd like to know!",
+    "weather": "I don't have access to current weather data, but I'd be happy to help you find weather information or answer other questions!",
+    "time": "I don't have access to real-time data, but I can help you with other questions. Is there anything else I can assist you with?",
+    "thanks": "You're welcome! I'm glad I could help. Is there anything else you'd like to know?",
+    "goodbye": "Goodbye! Feel free to come back anytime if you have more questions. Have a great day!",
+}
+
 def generate_demo_response(message: str) -> str:
     """Generate demo responses for testing purposes"""
-    message_lower = message.lower()
-    
-    if any(greeting in message_lower for greeting in ['hello', 'hi', 'hey', 'good morning', 'good afternoon']):
-        return "Hello! I'm your AI voice assistant. How can I help you today?"
-    
-    elif any(question in message_lower for question in ['how are you', 'how do you do']):
-        return "I'm doing great, thank you for asking! I'm here to help answer your questions and assist with anything you need."
-    
-    elif any(word in message_lower for word in ['help', 'what can you do', 'capabilities']):
-        return "I can help you with questions, provide information, and have conversations. Try asking me about various topics or let me know what you'd like to know!"
-    
-    elif any(word in message_lower for word in ['weather', 'temperature']):
-        return "I don't have access to current weather data, but I'd be happy to help you find weather information or answer other questions!"
-    
-    elif any(word in message_lower for word in ['time', 'date']):
-        return f"I don't have access to real-time data, but I can help you with other questions. Is there anything else I can assist you with?"
-    
-    elif any(word in message_lower for word in ['thank', 'thanks']):
-        return "You're welcome! I'm glad I could help. Is there anything else you'd like to know?"
-    
-    elif any(word in message_lower for word in ['bye', 'goodbye', 'see you']):
-        return "Goodbye! Feel free to come back anytime if you have more questions. Have a great day!"
-    
-    else:
-        return f"That's an interesting question about '{message}'. I'm currently in demo mode, but I'd be happy to help you explore this topic further. What specific aspect would you like to know more about?"
+    category = DEMO_RESPONSE_KEYWORDS.first_match(message.lower())
+    if category:
+        return DEMO_RESPONSES[category]
+    
+    return f"That's an interesting question about '{message}'. I'm currently in demo mode, but I'd be happy to help you explore this topic further. What specific aspect would you like to know more about?"
+
+# Default configuration (works for demo and fallback)
+DEFAULT_WIDGET_CONFIG = {
+    "greeting_message": "Hi there! I'm your virtual assistant. How can I help you today?",
+    "bot_name": "AI Assistant",
+    "theme": {
+        "primary_color": "#3B82F6",
+        "secondary_color": "#1E40AF",
+        "text_color": "#1F2937",
+        "background_color": "#FFFFFF"
+    },
+    "position": "bottom-right",
+    "auto_greet": True,
+    "voice_enabled": True,
+    "language": "en-US"
+}
+# Serialized once; only the site id is spliced in front of the remaining fields
+DEFAULT_WIDGET_CONFIG_TAIL = b"," + orjson.dumps(DEFAULT_WIDGET_CONFIG)[1:]
+
+# Serialized stored configs, reused while the database layer keeps returning the
+# same cached config object (a reload or invalidation yields a new object)
+widget_config_json_cache: TTLCache = TTLCache(maxsize=10_000, ttl=300)
+
+def widget_config_json(site_id: str, config: Dict[str, Any]) -> bytes:
+    """Return the JSON body for a stored widget config, serializing it only when it changes"""
+    cached = widget_config_json_cache.get(site_id)
+    if cached is not None and cached[0] is config:
+        return cached[1]
+    body = orjson.dumps(config)
+    widget_config_json_cache[site_id] = (config, body)
+    return body
 
 @app.post("/api/widget/config")
-async def get_widget_config(request: Request):
+async def get_widget_config(body: WidgetConfigRequest):
     """Get widget configuration for a specific site"""
     try:
-        body = await request.json()
-        site_id = body.get("site_id")
+        site_id = body.site_id
         
         if not site_id:
             raise HTTPException(status_code=400, detail="Site ID is required")
         
-        # Default configuration (works for demo and fallback)
-        default_config = {
-            "site_id": site_id,
-            "greeting_message": "Hi there! I'm your virtual assistant. How can I help you today?",
-            "bot_name": "AI Assistant",
-            "theme": {
-                "primary_color": "#3B82F6",
-                "secondary_color": "#1E40AF",
-                "text_color": "#1F2937",
-                "background_color": "#FFFFFF"
-            },
-            "position": "bottom-right",
-            "auto_greet": True,
-            "voice_enabled": True,
-            "language": "en-US"
-        }
-        
         # If database is available, try to get custom config
         if db_service:
             try:
                 config = await db_service.get_site_config(site_id)
                 if config:
-                    return config
+                    return Response(content=widget_config_json(site_id, config), media_type="application/json")
             except Exception as e:
-                logger.error(f"Failed to get widget config from database: {e}")
+                logger.error("Failed to get widget config from database: %s", e)
         
         # For demo sites or when database lookup fails, return default config
-        return default_config
+        return Response(
+            content=b'{"site_id":' + orjson.dumps(site_id) + DEFAULT_WIDGET_CONFIG_TAIL,
+            media_type="application/json"
+        )
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Widget config endpoint error: {e}")
+        logger.error("Widget config endpoint error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
-if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8001)
-
 # ============================================================================
 # WEBSITE INTELLIGENCE & ROI API ENDPOINTS
 # ============================================================================
@@ -1717,7 +2428,7 @@ async def crawl_website(site_id: str, current_user: UserDB = Depends(get_current
             raise HTTPException(status_code=404, detail="Site not found")
         
         # Start website crawling
-        async with WebsiteIntelligenceEngine(db_service) as intelligence:
+        async with WebsiteIntelligenceEngine(db_service, session=crawler_session) as intelligence:
             site_structure = await intelligence.crawl_website(
                 domain=site.domain,
                 max_pages=100,
@@ -1736,7 +2447,7 @@ async def crawl_website(site_id: str, current_user: UserDB = Depends(get_current
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Website crawling error: {e}")
+        logger.error("Website crawling error: %s", e)
         raise HTTPException(status_code=500, detail=f"Crawling failed: {str(e)}")
 
 @app.get("/api/sites/{site_id}/intelligence")
@@ -1772,14 +2483,14 @@ async def get_site_intelligence(site_id: str, current_user: UserDB = Depends(get
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Get site intelligence error: {e}")
+        logger.error("Get site intelligence error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/sites/{site_id}/analyze-intent")
 async def analyze_user_intent(site_id: str, request: Request):
     """Analyze user intent and provide intelligent recommendations."""
     try:
-        body = await request.json()
+        body = orjson.loads(await request.body())
         query = body.get("query", "").strip()
         current_page = body.get("current_page", "")
         visitor_id = body.get("visitor_id", "")
@@ -1793,7 +2504,7 @@ async def analyze_user_intent(site_id: str, request: Request):
             
             if intelligence_data:
                 # Use intelligence engine for analysis
-                async with WebsiteIntelligenceEngine(db_service) as intelligence:
+                async with WebsiteIntelligenceEngine(db_service, session=crawler_session) as intelligence:
                     # Reconstruct site structure from stored data
                     from website_intelligence import SiteStructure
                     site_structure = SiteStructure(**intelligence_data)
@@ -1862,7 +2573,7 @@ async def analyze_user_intent(site_id: str, request: Request):
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Intent analysis error: {e}")
+        logger.error("Intent analysis error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/sites/{site_id}/roi-report")
@@ -1913,7 +2624,7 @@ async def get_roi_report(site_id: str, days: int = 30, current_user: UserDB = De
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"ROI report error: {e}")
+        logger.error("ROI report error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/sites/{site_id}/user-journeys")
@@ -1967,14 +2678,14 @@ async def get_user_journeys(site_id: str, visitor_id: Optional[str] = None, days
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"User journeys error: {e}")
+        logger.error("User journeys error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/track-user-journey")
 async def track_user_journey(request: Request):
     """Track user journey for analytics."""
     try:
-        body = await request.json()
+        body = orjson.loads(await request.body())
         
         journey_data = {
             "visitor_id": body.get("visitor_id", ""),
@@ -2036,7 +2747,7 @@ async def track_user_journey(request: Request):
         return {"status": "journey_tracked"}
         
     except Exception as e:
-        logger.error(f"Journey tracking error: {e}")
+        logger.error("Journey tracking error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/sites/{site_id}/analytics/roi")
@@ -2076,7 +2787,7 @@ async def get_roi_analytics(site_id: str, days: int = 30, current_user: UserDB =
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"ROI analytics error: {e}")
+        logger.error("ROI analytics error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 # Helper functions for ROI calculations
@@ -2163,4 +2874,18 @@ def calculate_cost_savings(roi_report: Dict[str, Any]) -> float:
     support_cost_savings = roi_metrics.get("support_cost_savings", 0)
     
     # Normalize based on expected monthly savings (assuming $500/month is excellent)
-    return min(100, (support_cost_savings / 500) * 100)
\ No newline at end of file
+    return min(100, (support_cost_savings / 500) * 100)
+
+if __name__ == "__main__":
+    import uvicorn
+    # Pass the app as an import string so each worker process imports the module
+    # (and builds its own Mongo/GROQ clients) after the fork.
+    uvicorn.run(
+        "server:app",
+        host="0.0.0.0",
+        port=8001,
+        loop="uvloop",
+        http="httptools",
+        workers=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)),
+        log_level="info"
+    )
@@ -102,12 +102,21 @@ class ROIMetrics:
     navigation_efficiency: float
     content_effectiveness: float
 
+def create_crawler_session() -> aiohttp.ClientSession:
+    """HTTP session used to fetch pages for analysis"""
+    return aiohttp.ClientSession(
+        timeout=aiohttp.ClientTimeout(total=30),
+        headers={'User-Agent': 'AI Voice Assistant Website Intelligence Bot/1.0'}
+    )
+
 class WebsiteIntelligenceEngine:
     """Main engine for website crawling, analysis, and intelligence"""
     
-    def __init__(self, db_service=None):
+    def __init__(self, db_service=None, session: Optional[aiohttp.ClientSession] = None):
         self.db_service = db_service
-        self.session = None
+        # A session passed in is shared and stays open; otherwise one is opened per use
+        self.session = session
+        self.owns_session = session is None
         self.stop_words = set(stopwords.words('english'))
         
         # Intent classification patterns
@@ -140,22 +149,20 @@ class WebsiteIntelligenceEngine:
         
     async def __aenter__(self):
         """Async context manager entry"""
-        self.session = aiohttp.ClientSession(
-            timeout=aiohttp.ClientTimeout(total=30),
-            headers={'User-Agent': 'AI Voice Assistant Website Intelligence Bot/1.0'}
-        )
+        if self.owns_session:
+            self.session = create_crawler_session()
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         """Async context manager exit"""
-        if self.session:
+        if self.session and self.owns_session:
             await self.session.close()
     
     async def crawl_website(self, domain: str, max_pages: int = 100, max_depth: int = 3) -> SiteStructure:
         """
         Crawl and analyze entire website
         """
-        logger.info(f"Starting website crawl for {domain}")
+        logger.info("Starting website crawl for %s", domain)
         
         crawled_urls: Set[str] = set()
         to_crawl: List[Tuple[str, int]] = [(f"https://{domain}", 0)]
@@ -180,7 +187,7 @@ class WebsiteIntelligenceEngine:
                                 to_crawl.append((link, depth + 1))
                                 
             except Exception as e:
-                logger.error(f"Error crawling {url}: {e}")
+                logger.error("Error crawling %s: %s", url, e)
                 continue
         
         # Build site structure
@@ -190,7 +197,7 @@ class WebsiteIntelligenceEngine:
         if self.db_service:
             await self.store_site_structure(site_structure)
         
-        logger.info(f"Completed crawl for {domain}: {len(site_map)} pages analyzed")
+        logger.info("Completed crawl for %s: %s pages analyzed", domain, len(site_map))
         return site_structure
     
     async def analyze_page(self, url: str) -> Optional[PageData]:
@@ -274,7 +281,7 @@ class WebsiteIntelligenceEngine:
                 )
                 
         except Exception as e:
-            logger.error(f"Error analyzing page {url}: {e}")
+            logger.error("Error analyzing page %s: %s", url, e)
             return None
     
     def extract_main_content(self, soup: BeautifulSoup) -> str:
@@ -362,7 +369,7 @@ class WebsiteIntelligenceEngine:
             return [keyword for keyword, score in keyword_scores if score > 0]
             
         except Exception as e:
-            logger.error(f"Error extracting keywords: {e}")
+            logger.error("Error extracting keywords: %s", e)
             return []
     
     def extract_links(self, soup: BeautifulSoup, base_url: str) -> Tuple[List[str], List[str]]:
@@ -886,7 +893,7 @@ class WebsiteIntelligenceEngine:
             await self.db_service.store_site_structure(structure_data)
             
         except Exception as e:
-            logger.error(f"Error storing site structure: {e}")
+            logger.error("Error storing site structure: %s", e)
     
     async def analyze_user_intent(self, query: str, current_page: str, site_structure: SiteStructure) -> UserIntent:
         """Analyze user intent and provide intelligent recommendations"""